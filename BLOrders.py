@@ -1,3 +1,4 @@
+import multiprocessing
 from pathlib import Path
 
 import PySimpleGUI as sg
@@ -5,6 +6,7 @@ import PySimpleGUI as sg
 from OrderHandler import main
 from ImageEdit import merge
 from PDFMerge import merge_pdf
+from profiling import PROFILER
 
 
 def is_valid_path(filepath):
@@ -34,58 +36,75 @@ layout = [[
     [sg.Text("Wybierz folder z plikami PDF, które mają zostać złączone a następnie wybierz folder w którym ma zostać zapisany plik PDF.")],
     [sg.Text("Folder Wejściowy:"), sg.Input(key="-ORIGIN_FOLDER_PDF-"), sg.FolderBrowse()],
     [sg.Text("Folder Docelowy:"), sg.Input(key="-DESTINATION_FOLDER_PDF-"), sg.FolderBrowse(), sg.Button("Połącz PDF")],
+    [sg.Checkbox("Profilowanie (zapis w folderze logs)", key="-PROFILING-", default=PROFILER.enabled)],
     [sg.Exit(button_color="tomato", size=(10, 2))],
 ]]
 
-window = sg.Window("BLOrders", layout)
-
-while True:
-    event, values = window.read()
-
-    if event in (sg.WINDOW_CLOSED, "Exit"):
-        break
-
-    if event == "Pobierz Grafiki" or event == "Sprawdź Grafiki":
-        if is_valid_path(values["-IN-"]):
-            if event == "Pobierz Grafiki":
-                download_files = True
-            elif event == "Sprawdź Grafiki":
-                download_files = False
-            order_count, order_download_count, order_file_exists_count = main(values["-IN-"], download_files=download_files)
-            if download_files:
-                missing_files = order_count - order_download_count
-            else:
-                missing_files = order_count - order_file_exists_count
-
-            if order_count:
-                if order_download_count and download_files:
-                    popup_msg = f"Ukończono pobieranie.\n\nLiczba zamówień: {order_count}\nPobranych plików: {order_download_count}\nBrakujących plików: {missing_files}"
-                elif order_file_exists_count:
-                    popup_msg = f"Ukończono sprawdzanie plików.\n\nLiczba zamówień: {order_count}\nZnalezionych plików: {order_file_exists_count}\nBrakujących plików: {missing_files}"
+def run():
+    window = sg.Window("BLOrders", layout)
+
+    while True:
+        event, values = window.read()
+
+        if event in (sg.WINDOW_CLOSED, "Exit"):
+            break
+
+        PROFILER.enabled = values["-PROFILING-"]
+
+        if event == "Pobierz Grafiki" or event == "Sprawdź Grafiki":
+            if is_valid_path(values["-IN-"]):
+                if event == "Pobierz Grafiki":
+                    download_files = True
+                elif event == "Sprawdź Grafiki":
+                    download_files = False
+                order_count, order_download_count, order_file_exists_count = main(values["-IN-"], download_files=download_files)
+                if download_files:
+                    missing_files = order_count - order_download_count
                 else:
-                    popup_msg = f"Znaleziono {order_count} zamówień ale nie znaleziono żadnego plików."
-
-            else:
-                popup_msg = "Nie znaleziono zamówień."
-            sg.popup(
-                popup_msg,
-                no_titlebar=True,
-                background_color="red",
-                text_color="white"
-            )
-            continue
-
-    if event == "Połącz Grafiki":
-        if is_valid_path(values["-ORIGIN_FOLDER_PNG-"]) and is_valid_path(values["-DESTINATION_FOLDER_PNG-"]):
-            designs_count = merge(values["-ORIGIN_FOLDER_PNG-"], values["-DESTINATION_FOLDER_PNG-"])
-            if designs_count:
-                sg.popup_no_titlebar(f"""Połączono {designs_count} grafik.""")
-                continue
+                    missing_files = order_count - order_file_exists_count
+
+                if order_count:
+                    if order_download_count and download_files:
+                        popup_msg = f"Ukończono pobieranie.\n\nLiczba zamówień: {order_count}\nPobranych plików: {order_download_count}\nBrakujących plików: {missing_files}"
+                    elif order_file_exists_count:
+                        popup_msg = f"Ukończono sprawdzanie plików.\n\nLiczba zamówień: {order_count}\nZnalezionych plików: {order_file_exists_count}\nBrakujących plików: {missing_files}"
+                    else:
+                        popup_msg = f"Znaleziono {order_count} zamówień ale nie znaleziono żadnego plików."
 
-    if event == "Połącz PDF":
-        if is_valid_path(values["-ORIGIN_FOLDER_PDF-"]) and is_valid_path(values["-DESTINATION_FOLDER_PDF-"]):
-            result, designs_count = merge_pdf(values["-ORIGIN_FOLDER_PDF-"], values["-DESTINATION_FOLDER_PDF-"])
-        if result:
-            sg.popup_no_titlebar(f"""Połączono {designs_count} plików PDF.""")
+                else:
+                    popup_msg = "Nie znaleziono zamówień."
+                sg.popup(
+                    popup_msg,
+                    no_titlebar=True,
+                    background_color="red",
+                    text_color="white"
+                )
+                continue
 
-window.close()
\ No newline at end of file
+        if event == "Połącz Grafiki":
+            if is_valid_path(values["-ORIGIN_FOLDER_PNG-"]) and is_valid_path(values["-DESTINATION_FOLDER_PNG-"]):
+                designs_count = merge(
+                    values["-ORIGIN_FOLDER_PNG-"],
+                    values["-DESTINATION_FOLDER_PNG-"],
+                    progress=lambda done_count, sheets_count: sg.one_line_progress_meter(
+                        "Łączenie Grafik", done_count, sheets_count, orientation="h", no_button=True
+                    ),
+                )
+                if designs_count:
+                    sg.popup_no_titlebar(f"""Połączono {designs_count} grafik.""")
+                    continue
+
+        if event == "Połącz PDF":
+            if is_valid_path(values["-ORIGIN_FOLDER_PDF-"]) and is_valid_path(values["-DESTINATION_FOLDER_PDF-"]):
+                result, designs_count = merge_pdf(values["-ORIGIN_FOLDER_PDF-"], values["-DESTINATION_FOLDER_PDF-"])
+            if result:
+                sg.popup_no_titlebar(f"""Połączono {designs_count} plików PDF.""")
+
+    window.close()
+
+
+if __name__ == "__main__":
+    # Sheets are merged by worker processes, which import this module again - GUI must start only in the main
+    # process. freeze_support makes it work in exe built with PyInstaller.
+    multiprocessing.freeze_support()
+    run()
@@ -1 +1,9 @@
+from .scheduler import *
 from .drive import *
+from .batch import *
+from .catalog import *
+from .catalog_store import *
+from .crawler import *
+from .design_cache import *
+from .folder_cache import *
+from .async_drive import *
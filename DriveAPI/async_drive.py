@@ -0,0 +1,326 @@
+import asyncio
+import os
+import time
+from functools import partial
+
+try:
+    import aiohttp
+except ImportError:
+    # Async transport is optional, synchronous googleapiclient functions work without it.
+    aiohttp = None
+
+from google.auth.transport.requests import Request
+
+from error_handling import log_search, save_error_to_file
+from constants import ASYNC_DRIVE_CONNECTIONS, DOWNLOAD_CHUNK_SIZE
+from instrumentation import RUN_STATS
+from .drive import SEARCH_FIELDS, build_keywords_query, make_temp_path, save_design
+from .scheduler import DRIVE_SCHEDULER, RequestScheduler, is_retryable
+
+
+DRIVE_API_URL = "https://www.googleapis.com/drive/v3"
+FOLDER_QUERY = "mimeType='application/vnd.google-apps.folder'"
+
+
+class AsyncDriveClient:
+    """
+    Drive client for asyncio. All requests run on one event loop through a shared connection pool, at most
+    max_connections at the same time and within RequestScheduler budget, so thousands of lookups can be started
+    without a thread per request.
+    Uses OAuth credentials from Google.load_credentials, token is refreshed when it expires.
+
+    Use as async context manager:
+        async with AsyncDriveClient(credentials) as client:
+            files = await client.list_files("'folder_id' in parents")
+    """
+
+    def __init__(
+        self,
+        credentials,
+        max_connections: int = ASYNC_DRIVE_CONNECTIONS,
+        chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+        scheduler: RequestScheduler = DRIVE_SCHEDULER,
+    ):
+        if aiohttp is None:
+            raise ImportError("Async Drive client requires aiohttp, install it with: pip install aiohttp")
+
+        self.credentials = credentials
+        self.max_connections = max_connections
+        self.chunk_size = chunk_size
+        self.scheduler = scheduler
+        # Loop bound objects are created in __aenter__, inside the running event loop.
+        self._session = None
+        self._semaphore = None
+        self._token_lock = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_connections))
+        self._semaphore = asyncio.Semaphore(self.max_connections)
+        self._token_lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+
+    async def _get_headers(self, force_refresh=False) -> dict:
+        async with self._token_lock:
+            if force_refresh or not self.credentials.valid:
+                # Refresh is a blocking request, it must not stop the event loop.
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self.credentials.refresh, Request())
+        return {"Authorization": f"Bearer {self.credentials.token}"}
+
+    async def _get(self, path: str, params: dict, handle_response, headers: dict = None, endpoint: str = None):
+        """
+        Send GET request through the scheduler. Rate limited and server errors are retried with backoff, expired
+        token is refreshed once.
+
+        :param handle_response: coroutine function called with successful response, its result is returned
+        :param endpoint: API method counted by the scheduler, e.g. "drive.files.list"
+        """
+        attempt = 0
+        refresh_token = False
+
+        async with self._semaphore:
+            while True:
+                await asyncio.sleep(self.scheduler.reserve())
+                self.scheduler.count_endpoint(endpoint)
+
+                request_headers = await self._get_headers(force_refresh=refresh_token)
+                request_headers.update(headers or {})
+                async with self._session.get(DRIVE_API_URL + path, params=params, headers=request_headers) as response:
+                    if response.status < 400:
+                        return await handle_response(response)
+                    content = await response.read()
+
+                if response.status == 401 and not refresh_token:
+                    # Token revoked or expired in the meantime - refresh it once.
+                    refresh_token = True
+                    continue
+
+                if attempt < self.scheduler.max_retries and is_retryable(response.status, content):
+                    print(f"Drive request failed with {response.status}, retrying...")
+                    await asyncio.sleep(self.scheduler.get_backoff(attempt))
+                    attempt += 1
+                    continue
+
+                self.scheduler.count("failed")
+                raise aiohttp.ClientResponseError(
+                    response.request_info,
+                    response.history,
+                    status=response.status,
+                    message=response.reason,
+                    headers=response.headers,
+                )
+
+    async def _get_json(self, path: str, params: dict) -> dict:
+        async def read_json(response):
+            return await response.json()
+
+        return await self._get(path, params, read_json, endpoint="drive.files.list")
+
+    async def list_files(self, query: str, fields: str = SEARCH_FIELDS, page_size: int = 1000) -> list:
+        """
+        All files matching Drive query, every result page is fetched.
+        """
+        files = []
+        params = {"q": query, "spaces": "drive", "fields": fields, "pageSize": page_size}
+
+        while True:
+            response = await self._get_json("/files", params)
+            files.extend(response.get("files", []))
+            page_token = response.get("nextPageToken", None)
+            if page_token is None:
+                break
+            params["pageToken"] = page_token
+
+        return files
+
+    async def list_folders(self, drive_folder_id: str) -> list:
+        """
+        Async version of DriveAPI.list_folders.
+        """
+        try:
+            return await self.list_files(
+                f"'{drive_folder_id}' in parents and {FOLDER_QUERY}", fields="nextPageToken, files(id, name)"
+            )
+        except aiohttp.ClientError as error:
+            print(f"An error occurred: {error}")
+            return []
+
+    async def find_folder_id_by_name(self, name: str, root_folder_id: str = None) -> str:
+        """
+        Async version of DriveAPI.find_folder_id_by_name.
+        """
+        query = f"name contains '{name}' and {FOLDER_QUERY}"
+        if root_folder_id:
+            query = f"'{root_folder_id}' in parents and {query}"
+
+        try:
+            folders = await self.list_files(query, fields="nextPageToken, files(id, name)")
+        except aiohttp.ClientError as error:
+            print(f"An error occurred: {error}")
+            return None
+
+        if folders:
+            shortest_folder_name = min(folders, key=lambda x: len(x["name"]))
+            return shortest_folder_name["id"]
+
+    async def find_file_by_keywords(self, keywords: list, root_folder_id: str = None) -> dict:
+        """
+        Async version of DriveAPI.find_file_in_folder_by_keywords.
+
+        :return: dict, {"name": "file_name", "id": "file_id", "md5Checksum": "..."}
+        """
+        started = time.perf_counter()
+        query = build_keywords_query(keywords, root_folder_id)
+        code_name = "_".join(keywords)
+        error_message = None
+
+        print(f"\nSearch for {code_name}...")
+
+        try:
+            found_files = await self.list_files(query)
+        except aiohttp.ClientError as error:
+            print(error_message := f"An error occurred: {error}")
+            found_files = []
+
+        for file in found_files:
+            print(f'Found file: {file.get("name")}')
+
+        if found_files:
+            shortest_file = min(found_files, key=lambda x: len(x["name"]))
+            shortest_file["name"] = shortest_file["name"].replace(" ", "_")
+        else:
+            shortest_file = None
+            print(f"Not found {code_name}")
+
+        log_search(query, found_files, shortest_file, started, error=error_message)
+        return shortest_file
+
+    async def find_file_in_folder(self, design: str, endcode: str, root_folder_id: str = None) -> dict:
+        """
+        Async version of DriveAPI.find_file_in_folder.
+        """
+        query = f"name contains '{design}' and name contains '{endcode}' and mimeType contains 'image/'"
+        if root_folder_id:
+            query = f"'{root_folder_id}' in parents and {query}"
+
+        try:
+            found_files = await self.list_files(query)
+        except aiohttp.ClientError as error:
+            print(f"An error occurred: {error}")
+            return None
+
+        if found_files:
+            shortest_file = min(found_files, key=lambda x: len(x["name"]))
+            shortest_file["name"] = shortest_file["name"].replace(" ", "_")
+            return shortest_file
+
+    async def recursive_find_file(self, design: str, endcode: str, root_folder_id: str = None) -> dict:
+        """
+        Async version of DriveAPI.recursive_find_file_id_in_folder. Subfolders are searched at the same time, the
+        result is the same as of the depth first search - first match in folder listing order wins.
+        """
+        file_data = await self.find_file_in_folder(design, endcode, root_folder_id)
+        if file_data:
+            return file_data
+
+        folders = await self.list_folders(root_folder_id)
+        results = await asyncio.gather(
+            *(self.recursive_find_file(design, endcode, folder["id"]) for folder in folders)
+        )
+        return next((file_data for file_data in results if file_data), None)
+
+    async def _download_range(self, file_id: str, file, start: int) -> int:
+        """
+        Write one chunk of file content starting at start byte to file.
+
+        :return: total file size
+        """
+        end = start + self.chunk_size - 1
+
+        async def write_content(response):
+            # Retried request starts the chunk again.
+            file.seek(start)
+            file.truncate()
+            async for data in response.content.iter_chunked(64 * 1024):
+                file.write(data)
+            # "bytes 0-999/1234", server may also send whole small file without range
+            content_range = response.headers.get("Content-Range")
+            if content_range:
+                return int(content_range.rsplit("/", 1)[1])
+            return start + int(response.headers.get("Content-Length", 0))
+
+        try:
+            return await self._get(
+                f"/files/{file_id}",
+                {"alt": "media"},
+                write_content,
+                headers={"Range": f"bytes={start}-{end}"},
+                endpoint="drive.files.get_media",
+            )
+        except aiohttp.ClientResponseError as error:
+            if error.status == 416:
+                # Empty file has no satisfiable range.
+                return 0
+            raise
+
+    async def download_file(
+        self,
+        file_id: str,
+        file_name: str,
+        destination_folder: str,
+        is_adult=True,
+        md5_checksum: str = None,
+        cache=None,
+    ) -> bool:
+        """
+        Async version of DriveAPI.download_file_by_id. File is downloaded in ranged requests of chunk_size bytes to
+        temporary file and renamed when complete.
+
+        :return: True if file was saved
+        """
+        loop = asyncio.get_running_loop()
+        file_path = os.path.join(destination_folder, file_name)
+
+        cached_path = cache.get(file_id, md5_checksum) if cache and md5_checksum else None
+        if cached_path:
+            print(f"Found in cache - {file_name}")
+            await loop.run_in_executor(
+                None, partial(save_design, cached_path, file_path, is_adult=is_adult, keep_source=True)
+            )
+            return True
+
+        temp_path = make_temp_path(file_path)
+
+        done = False
+
+        try:
+            with RUN_STATS.measure("download") as stage, open(temp_path, "wb") as file:
+                position = 0
+                size = None
+                while size is None or position < size:
+                    size = await self._download_range(file_id, file, position)
+                    if file.tell() == position and position < size:
+                        raise IOError(f"Download stopped at {position} of {size} bytes.")
+                    position = file.tell()
+                    print(f"Download {int(position / size * 100) if size else 100}% - {file_name}")
+                stage["bytes"] = position
+            done = True
+        except Exception as e:
+            save_error_to_file(f"Download error: {e}", file_name=file_name, file_id=file_id)
+
+        if not done:
+            # Don't leave incomplete design in the output folder.
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+
+        if cache and md5_checksum:
+            with RUN_STATS.measure("cache_put"):
+                await loop.run_in_executor(None, cache.put, file_id, md5_checksum, temp_path)
+
+        # Kids designs are scaled with Pillow, keep it off the event loop.
+        await loop.run_in_executor(None, partial(save_design, temp_path, file_path, is_adult=is_adult))
+        return True
@@ -0,0 +1,144 @@
+import time
+
+import httplib2
+from googleapiclient.discovery import Resource
+from googleapiclient.errors import HttpError
+
+from error_handling import log_search
+from .drive import SEARCH_FIELDS, build_keywords_query
+from .scheduler import DRIVE_SCHEDULER, RequestScheduler, is_retryable_error
+
+
+# Drive API accepts up to 100 calls in one batch request.
+BATCH_SIZE = 100
+
+
+def execute_batch(
+    drive_service: Resource, requests: dict, scheduler: RequestScheduler = DRIVE_SCHEDULER, http=None
+) -> dict:
+    """
+    Send given requests grouped in batches of up to BATCH_SIZE calls. Every call counts against the scheduler
+    budget. Calls which failed with rate limit or server error are sent again in next batches with backoff.
+    If a whole batch request fails, with Drive or connection error, all its calls get the error instead of raising it.
+
+    :param drive_service: Google Drive API service
+    :param requests: dict, {key: HttpRequest}
+    :param scheduler: RequestScheduler the batches go through
+    :param http: authorized http client to send batches with, required when called from worker threads
+    :return: dict, {key: (response, exception)}
+    """
+    keys = list(requests)
+    results = {}
+
+    def callback(request_id, response, exception):
+        results[keys[int(request_id)]] = (response, exception)
+
+    pending = list(range(len(keys)))
+    failed_batch_indexes = set()
+    attempt = 0
+
+    while pending:
+        for start in range(0, len(pending), BATCH_SIZE):
+            batch_indexes = pending[start:start + BATCH_SIZE]
+            batch = drive_service.new_batch_http_request(callback=callback)
+            for i in batch_indexes:
+                batch.add(requests[keys[i]], request_id=str(i))
+                scheduler.count_endpoint(getattr(requests[keys[i]], "methodId", None))
+            try:
+                scheduler.call(batch.execute, http=http, cost=len(batch_indexes))
+            except (HttpError, httplib2.HttpLib2Error, OSError) as error:
+                # Whole batch failed (Drive error already retried by the scheduler, or connection error, e.g. timeout),
+                # every call of it fails with the error.
+                for i in batch_indexes:
+                    results[keys[i]] = (None, error)
+                    failed_batch_indexes.add(i)
+
+        pending = [
+            i for i in pending if i not in failed_batch_indexes and is_retryable_error(results[keys[i]][1])
+        ]
+        if pending:
+            if attempt >= scheduler.max_retries:
+                scheduler.count("failed", len(pending))
+                break
+            print(f"{len(pending)} batched Drive requests failed, retrying...")
+            time.sleep(scheduler.get_backoff(attempt))
+            attempt += 1
+
+    return results
+
+
+def batch_list_files(
+    drive_service: Resource, queries: dict, fields: str = SEARCH_FIELDS, page_size: int = None, http=None
+) -> dict:
+    """
+    Run many files().list queries in batches. Queries with more result pages are sent again in next batch
+    until all pages are fetched.
+
+    :param queries: dict, {key: query}
+    :param page_size: max number of files in one result page, Drive default is 100
+    :param http: authorized http client to send batches with, required when called from worker threads
+    :return: dict, {key: list of files or None if query failed}
+    """
+    found_files = {key: [] for key in queries}
+    page_tokens = {key: None for key in queries}
+
+    while page_tokens:
+        requests = {
+            key: drive_service.files().list(
+                q=queries[key],
+                spaces="drive",
+                fields=fields,
+                pageSize=page_size,
+                pageToken=page_token,
+            )
+            for key, page_token in page_tokens.items()
+        }
+        page_tokens = {}
+
+        for key, (response, error) in execute_batch(drive_service, requests, http=http).items():
+            if error:
+                print(f"An error occurred: {error}")
+                found_files[key] = None
+                continue
+            found_files[key].extend(response.get("files", []))
+            if response.get("nextPageToken"):
+                page_tokens[key] = response["nextPageToken"]
+
+    return found_files
+
+
+def batch_find_files_by_keywords(drive_service: Resource, searches: dict) -> dict:
+    """
+    Batched version of find_file_in_folder_by_keywords.
+
+    :param searches: dict, {key: (keywords, root_folder_id)}
+    :return: dict, {key: {"name": "file_name", "id": "file_id"} or None}
+    """
+    started = time.perf_counter()
+    queries = {
+        key: build_keywords_query(keywords, root_folder_id) for key, (keywords, root_folder_id) in searches.items()
+    }
+    found_files = batch_list_files(drive_service, queries)
+
+    results = {}
+
+    for key, (keywords, _) in searches.items():
+        code_name = "_".join(keywords)
+        print(f"\nSearch for {code_name}...")
+
+        files = found_files[key] or []
+        for file in files:
+            print(f'Found file: {file.get("name")}')
+
+        if files:
+            shortest_file = min(files, key=lambda x: len(x["name"]))
+            shortest_file["name"] = shortest_file["name"].replace(" ", "_")
+            results[key] = shortest_file
+        else:
+            print(f"Not found {code_name}")
+            results[key] = None
+
+        # Searches of one batch share its latency.
+        log_search(queries[key], found_files[key], results[key], started, batched=True)
+
+    return results
@@ -0,0 +1,277 @@
+import bisect
+import re
+import time
+
+from googleapiclient.discovery import Resource
+from googleapiclient.errors import HttpError
+
+from error_handling import log_search
+from .catalog_store import CHANGE_FIELDS, CatalogStore
+from .drive import build_keywords_query
+from .scheduler import DRIVE_SCHEDULER
+
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+CATALOG_FIELDS = "nextPageToken, files(id, name, mimeType, parents, md5Checksum, modifiedTime)"
+
+_TOKEN_SPLIT = re.compile(r"[\W_]+")
+
+
+def tokenize_name(name: str) -> list:
+    """
+    Split file name into lowercase search terms, the same way Drive splits names for "name contains" queries.
+    ZAJZAW_Geode_04C.png ===> ["zajzaw", "geode", "04c", "png"]
+    """
+    return [token for token in _TOKEN_SPLIT.split(name.lower()) if token]
+
+
+class DriveCatalog:
+    """
+    In-memory index of Drive folders content. Each folder is listed once and keyword searches are answered locally
+    with the same result as DriveAPI.find_file_in_folder_by_keywords.
+
+    If a CatalogStore is given, listed folders are persisted and on the next run only Drive changes since the
+    saved page token are fetched.
+    """
+
+    def __init__(self, drive_service: Resource = None, store: CatalogStore = None):
+        self.drive_service = drive_service
+        self.store = store
+        self._store_synced = False
+        self._store_sync_attempted = False
+        self._files = {}  # folder id -> list of file dicts in listing order
+        self._index = {}  # folder id -> {token: set of positions in folder file list}
+        self._sorted_tokens = {}  # folder id -> sorted tokens for prefix lookup
+
+    def has_folder(self, folder_id: str) -> bool:
+        return folder_id in self._files
+
+    def load_folders(self, folder_ids: list) -> None:
+        """
+        List each given drive folder once and index its content. Already loaded and empty ids are skipped.
+        """
+        for folder_id in dict.fromkeys(folder_ids):
+            if folder_id and not self.has_folder(folder_id):
+                if not self.load_stored_folder(folder_id):
+                    self.load_folder(folder_id)
+
+    def load_stored_folder(self, folder_id: str) -> bool:
+        """
+        Index folder from CatalogStore if it is persisted there and up to date.
+
+        :return: True if folder was loaded
+        """
+        if self.store and not self._store_sync_attempted:
+            # Failed sync is not repeated for every folder, folders are listed from Drive instead.
+            self._store_sync_attempted = True
+            self.sync_store()
+
+        if self.store and self._store_synced and self.store.is_tracked(folder_id):
+            self.add_folder(folder_id, self.store.get_folder_files(folder_id))
+            return True
+        return False
+
+    def sync_store(self) -> None:
+        """
+        Bring persisted folders up to date with Drive changes since the last run. On the first run only the start
+        page token is saved, folders are listed afterwards.
+        """
+        page_token = self.store.get_page_token()
+
+        try:
+            if page_token is None:
+                response = DRIVE_SCHEDULER.execute(self.drive_service.changes().getStartPageToken())
+                self.store.set_page_token(response["startPageToken"])
+                self._store_synced = True
+                return
+
+            changes = []
+            while True:
+                response = DRIVE_SCHEDULER.execute(
+                    self.drive_service.changes()
+                    .list(
+                        pageToken=page_token,
+                        spaces="drive",
+                        fields=CHANGE_FIELDS,
+                        pageSize=1000,
+                    )
+                )
+                changes.extend(response.get("changes", []))
+                page_token = response.get("nextPageToken", None)
+                if page_token is None:
+                    new_page_token = response.get("newStartPageToken")
+                    break
+
+        except HttpError as error:
+            # Cached folders may be stale, list them again in this run.
+            print(f"An error occurred: {error}")
+            return
+
+        changed_folders = self.store.apply_changes(changes)
+        self.store.set_page_token(new_page_token)
+        self._store_synced = True
+        print(f"Drive catalog updated with {len(changes)} changes.")
+
+        for folder_id in changed_folders & set(self._files):
+            self.add_folder(folder_id, self.store.get_folder_files(folder_id))
+
+    def load_folder(self, folder_id: str) -> None:
+        files = []
+        query = f"'{folder_id}' in parents"
+
+        print(f"\nIndexing drive folder {folder_id}...")
+        try:
+            page_token = None
+            while True:
+                response = DRIVE_SCHEDULER.execute(
+                    self.drive_service.files()
+                    .list(
+                        q=query,
+                        spaces="drive",
+                        fields=CATALOG_FIELDS,
+                        pageSize=1000,
+                        pageToken=page_token,
+                    )
+                )
+                files.extend(response.get("files", []))
+                page_token = response.get("nextPageToken", None)
+                if page_token is None:
+                    break
+
+        except HttpError as error:
+            # Folder stays not indexed, searches in it will fall back to Drive queries.
+            print(f"An error occurred: {error}")
+            return
+
+        self.save_folder(folder_id, files)
+        print(f"Indexed {len(files)} files.")
+
+    def save_folder(self, folder_id: str, files: list) -> None:
+        """
+        Index folder content listed from Drive and persist it in CatalogStore.
+        """
+        if self.store and self._store_synced:
+            self.store.replace_folder(folder_id, files)
+        self.add_folder(folder_id, files)
+
+    def add_folder(self, folder_id: str, files: list) -> None:
+        """
+        Index given folder content. Files must be dicts with at least "id" and "name" keys.
+        """
+        index = {}
+        for position, file in enumerate(files):
+            for token in tokenize_name(file["name"]):
+                index.setdefault(token, set()).add(position)
+
+        self._files[folder_id] = list(files)
+        self._index[folder_id] = index
+        self._sorted_tokens[folder_id] = sorted(index)
+
+    def list_files(self, folder_id: str) -> list:
+        """
+        Cached equivalent of DriveAPI.list_files - images inside indexed folder.
+        """
+        return [
+            {"id": file["id"], "name": file["name"]}
+            for file in self._files[folder_id]
+            if "image/" in file.get("mimeType", "")
+        ]
+
+    def list_folders(self, folder_id: str) -> list:
+        """
+        Cached equivalent of DriveAPI.list_folders - subfolders of indexed folder.
+        """
+        return [
+            {"id": file["id"], "name": file["name"]}
+            for file in self._files[folder_id]
+            if file.get("mimeType") == FOLDER_MIME_TYPE
+        ]
+
+    def _positions_for_keyword(self, folder_id: str, keyword: str) -> set:
+        index = self._index[folder_id]
+        sorted_tokens = self._sorted_tokens[folder_id]
+        positions = None
+
+        # Every term of the keyword must be a prefix of some term of the file name.
+        for term in tokenize_name(keyword):
+            term_positions = set()
+            start = bisect.bisect_left(sorted_tokens, term)
+            for token in sorted_tokens[start:]:
+                if not token.startswith(term):
+                    break
+                term_positions |= index[token]
+            positions = term_positions if positions is None else positions & term_positions
+
+        return positions if positions is not None else set(range(len(self._files[folder_id])))
+
+    def find_files_by_keywords(self, keywords: list, folder_id: str) -> list:
+        """
+        Return all files in folder which names contain all keywords, in Drive listing order.
+        """
+        if not all(isinstance(keyword, str) for keyword in keywords):
+            raise ValueError("Keywords must be a list of strings.")
+
+        positions = None
+        for keyword in keywords:
+            keyword_positions = self._positions_for_keyword(folder_id, keyword)
+            positions = keyword_positions if positions is None else positions & keyword_positions
+            if not positions:
+                return []
+
+        files = self._files[folder_id]
+        if positions is None:
+            return list(files)
+        return [files[position] for position in sorted(positions)]
+
+    def find_image_by_keywords(self, keywords: list, folder_id: str) -> dict:
+        """
+        Cached equivalent of DriveAPI.find_file_in_folder - image inside indexed folder which name contains all
+        keywords. The file with the shortest name wins.
+
+        :return: dict, {"name": "file_name", "id": "file_id"}
+        """
+        images = [
+            file for file in self.find_files_by_keywords(keywords, folder_id) if "image/" in file.get("mimeType", "")
+        ]
+        if images:
+            shortest_file = dict(min(images, key=lambda x: len(x["name"])))
+            shortest_file["name"] = shortest_file["name"].replace(" ", "_")
+            return shortest_file
+
+    def find_folder_by_keywords(self, keywords: list, folder_id: str) -> dict:
+        """
+        Cached equivalent of DriveAPI.find_folder_id_by_name - subfolder of indexed folder which name contains all
+        keywords. The folder with the shortest name wins.
+        """
+        folders = [
+            file
+            for file in self.find_files_by_keywords(keywords, folder_id)
+            if file.get("mimeType") == FOLDER_MIME_TYPE
+        ]
+        if folders:
+            return min(folders, key=lambda x: len(x["name"]))
+
+    def find_file_by_keywords(self, keywords: list, folder_id: str) -> dict:
+        """
+        Find file that contains keywords in name inside indexed folder. The file with the shortest name wins.
+
+        :return: dict, {"name": "file_name", "id": "file_id"}
+        """
+        started = time.perf_counter()
+        code_name = "_".join(keywords)
+
+        print(f"\nSearch for {code_name}...")
+
+        found_files = self.find_files_by_keywords(keywords, folder_id)
+        for file in found_files:
+            print(f'Found file: {file.get("name")}')
+
+        if found_files:
+            shortest_file = dict(min(found_files, key=lambda x: len(x["name"])))
+            shortest_file["name"] = shortest_file["name"].replace(" ", "_")
+        else:
+            shortest_file = None
+            print(f"Not found {code_name}")
+
+        log_search(build_keywords_query(keywords, folder_id), found_files, shortest_file, started, local=True)
+        return shortest_file
@@ -0,0 +1,165 @@
+import os
+import sqlite3
+
+
+CHANGE_FIELDS = (
+    "nextPageToken, newStartPageToken, "
+    "changes(fileId, removed, file(id, name, mimeType, parents, md5Checksum, modifiedTime))"
+)
+
+
+def get_catalog_store_path(api_name: str = "drive", api_version: str = "v3") -> str:
+    """
+    Catalog cache is kept next to the OAuth token pickle created by Google.create_service.
+    """
+    return os.path.join(os.getcwd(), f"catalog_{api_name}_{api_version}.sqlite3")
+
+
+class CatalogStore:
+    """
+    Persistent SQLite copy of indexed Drive folders. Kept up to date with Drive Changes API, so indexed folders
+    don't have to be listed again on every run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS folders (
+                id TEXT PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                id TEXT NOT NULL,
+                parent TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                mime_type TEXT,
+                md5_checksum TEXT,
+                modified_time TEXT,
+                PRIMARY KEY (id, parent)
+            );
+            CREATE INDEX IF NOT EXISTS files_parent ON files (parent, position);
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            """
+        )
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_page_token(self) -> str:
+        row = self.connection.execute("SELECT value FROM state WHERE key = 'page_token'").fetchone()
+        return row[0] if row else None
+
+    def set_page_token(self, page_token: str) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES ('page_token', ?)", (page_token,)
+        )
+        self.connection.commit()
+
+    def is_tracked(self, folder_id: str) -> bool:
+        row = self.connection.execute("SELECT 1 FROM folders WHERE id = ?", (folder_id,)).fetchone()
+        return row is not None
+
+    def get_folder_files(self, folder_id: str) -> list:
+        """
+        Return folder content in the order it was listed from Drive.
+        """
+        rows = self.connection.execute(
+            "SELECT id, name, mime_type, md5_checksum, modified_time FROM files WHERE parent = ? ORDER BY position",
+            (folder_id,),
+        )
+        files = []
+        for file_id, name, mime_type, md5_checksum, modified_time in rows:
+            file = {"id": file_id, "name": name, "mimeType": mime_type, "parents": [folder_id]}
+            if md5_checksum:
+                file["md5Checksum"] = md5_checksum
+            if modified_time:
+                file["modifiedTime"] = modified_time
+            files.append(file)
+        return files
+
+    def replace_folder(self, folder_id: str, files: list) -> None:
+        with self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO folders (id) VALUES (?)", (folder_id,))
+            self.connection.execute("DELETE FROM files WHERE parent = ?", (folder_id,))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        file["id"],
+                        folder_id,
+                        position,
+                        file["name"],
+                        file.get("mimeType"),
+                        file.get("md5Checksum"),
+                        file.get("modifiedTime"),
+                    )
+                    for position, file in enumerate(files)
+                ],
+            )
+
+    def apply_changes(self, changes: list) -> set:
+        """
+        Apply Drive changes().list entries to tracked folders.
+
+        :return: set of tracked folder ids which content changed
+        """
+        changed_folders = set()
+
+        with self.connection:
+            for change in changes:
+                file_id = change.get("fileId")
+                file = change.get("file")
+
+                parents = set()
+                if not change.get("removed") and file:
+                    parents = set(file.get("parents", []))
+
+                # Drop file from folders it is no longer in (or from every folder if removed).
+                for (parent,) in self.connection.execute(
+                    "SELECT parent FROM files WHERE id = ?", (file_id,)
+                ).fetchall():
+                    if parent not in parents:
+                        self.connection.execute(
+                            "DELETE FROM files WHERE id = ? AND parent = ?", (file_id, parent)
+                        )
+                        changed_folders.add(parent)
+
+                for parent in parents:
+                    if not self.is_tracked(parent):
+                        continue
+                    row = self.connection.execute(
+                        "SELECT position FROM files WHERE id = ? AND parent = ?", (file_id, parent)
+                    ).fetchone()
+                    if row:
+                        position = row[0]
+                    else:
+                        position = self.connection.execute(
+                            "SELECT COALESCE(MAX(position) + 1, 0) FROM files WHERE parent = ?", (parent,)
+                        ).fetchone()[0]
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            file_id,
+                            parent,
+                            position,
+                            file["name"],
+                            file.get("mimeType"),
+                            file.get("md5Checksum"),
+                            file.get("modifiedTime"),
+                        ),
+                    )
+                    changed_folders.add(parent)
+
+        return changed_folders
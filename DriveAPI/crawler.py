@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from googleapiclient.discovery import Resource
+
+from constants import DOWNLOAD_WORKERS
+from Google import get_thread_http
+from .batch import BATCH_SIZE, batch_list_files
+from .catalog import CATALOG_FIELDS, DriveCatalog
+
+
+# Folders listed by one "'a' in parents or 'b' in parents" query. Keeps query well below Drive query length limit.
+PARENTS_PER_QUERY = 20
+
+
+def build_parents_query(folder_ids: list) -> str:
+    return " or ".join(f"'{folder_id}' in parents" for folder_id in folder_ids)
+
+
+def list_folders_content(drive_service: Resource, folder_ids: list, credentials=None, workers=DOWNLOAD_WORKERS) -> dict:
+    """
+    List content of many folders at once. Folders are grouped by PARENTS_PER_QUERY in one query, queries are sent
+    in batches and batches are sent by worker threads if credentials are given.
+
+    :return: dict, {folder_id: list of files or None if listing failed}
+    """
+    queries = {}
+    for start in range(0, len(folder_ids), PARENTS_PER_QUERY):
+        group = tuple(folder_ids[start:start + PARENTS_PER_QUERY])
+        queries[group] = build_parents_query(group)
+
+    keys = list(queries)
+    query_batches = [
+        {key: queries[key] for key in keys[start:start + BATCH_SIZE]} for start in range(0, len(keys), BATCH_SIZE)
+    ]
+
+    def list_batch(batch_queries):
+        http = get_thread_http(credentials) if credentials else None
+        return batch_list_files(drive_service, batch_queries, fields=CATALOG_FIELDS, page_size=1000, http=http)
+
+    found_files = {}
+    if credentials and workers > 1 and len(query_batches) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for result in executor.map(list_batch, query_batches):
+                found_files.update(result)
+    else:
+        for batch_queries in query_batches:
+            found_files.update(list_batch(batch_queries))
+
+    content = {}
+    for group, files in found_files.items():
+        if files is None:
+            content.update({folder_id: None for folder_id in group})
+            continue
+
+        group_content = {folder_id: [] for folder_id in group}
+        for file in files:
+            # File may be in several listed folders.
+            for parent in file.get("parents", []):
+                if parent in group_content:
+                    group_content[parent].append(file)
+        content.update(group_content)
+
+    return content
+
+
+def crawl_folder_tree(
+    drive_service: Resource,
+    root_folder_ids: list,
+    catalog: DriveCatalog = None,
+    credentials=None,
+    workers: int = DOWNLOAD_WORKERS,
+    max_depth: int = None,
+    stop=None,
+) -> DriveCatalog:
+    """
+    Index whole folder trees under given folders, breadth first. Every level of the tree is listed at once with
+    list_folders_content instead of one query per folder. Folders already indexed in catalog or up to date in its
+    CatalogStore are not listed again.
+
+    :param root_folder_ids: folders to crawl
+    :param catalog: DriveCatalog to fill, new one is created if not given
+    :param credentials: OAuth credentials, needed to list a level with several worker threads
+    :param max_depth: number of subfolder levels to crawl, all if None
+    :param stop: optional function called with each listed file. When it returns True crawling ends after the
+        current level.
+    :return: DriveCatalog with crawled folders indexed. Folders which listing failed are not indexed.
+    """
+    catalog = catalog or DriveCatalog(drive_service)
+
+    visited = set()
+    level = [folder_id for folder_id in dict.fromkeys(root_folder_ids) if folder_id]
+    depth = 0
+
+    while level:
+        visited.update(level)
+        print(f"\nCrawling {len(level)} folders on level {depth}...")
+
+        to_list = [
+            folder_id
+            for folder_id in level
+            if not catalog.has_folder(folder_id) and not catalog.load_stored_folder(folder_id)
+        ]
+
+        stopped = False
+        for folder_id, files in list_folders_content(drive_service, to_list, credentials, workers).items():
+            if files is None:
+                continue
+            catalog.save_folder(folder_id, files)
+            if stop and not stopped:
+                stopped = any(stop(file) for file in files)
+
+        if stopped or (max_depth is not None and depth >= max_depth):
+            break
+
+        next_level = []
+        for folder_id in level:
+            if catalog.has_folder(folder_id):
+                next_level.extend(
+                    folder["id"] for folder in catalog.list_folders(folder_id) if folder["id"] not in visited
+                )
+        level = list(dict.fromkeys(next_level))
+        depth += 1
+
+    return catalog
@@ -0,0 +1,92 @@
+import os
+import threading
+from collections import OrderedDict
+
+from utils import link_or_copy
+
+
+class DesignCache:
+    """
+    Local copies of downloaded designs keyed by Drive file id and md5Checksum. A design is taken from the cache as long
+    as its checksum on Drive did not change. Least recently used files are removed when cache grows over max_size.
+    """
+
+    def __init__(self, cache_folder: str, max_size: int):
+        """
+        :param cache_folder: absolute path to folder with cached files
+        :param max_size: max size of cached files in bytes
+        """
+        self.cache_folder = cache_folder
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # file name -> size, least recently used first
+        self._size = 0
+
+        os.makedirs(cache_folder, exist_ok=True)
+
+        entries = []
+        for entry in os.scandir(cache_folder):
+            if entry.is_file() and not entry.name.endswith(".part"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+            self._size += size
+
+    @staticmethod
+    def _entry_name(file_id: str, md5_checksum: str) -> str:
+        return f"{file_id}-{md5_checksum}"
+
+    def get(self, file_id: str, md5_checksum: str) -> str:
+        """
+        Return path to cached copy of the file or None if there is no copy with given checksum.
+        """
+        name = self._entry_name(file_id, md5_checksum)
+
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+            path = os.path.join(self.cache_folder, name)
+            try:
+                # Access time is kept in mtime, so LRU order survives between runs.
+                os.utime(path)
+            except OSError:
+                self._size -= self._entries.pop(name)
+                return None
+
+        return path
+
+    def put(self, file_id: str, md5_checksum: str, file_path: str) -> None:
+        """
+        Save copy of downloaded file in cache. Older versions of the same Drive file are removed.
+        """
+        name = self._entry_name(file_id, md5_checksum)
+        path = os.path.join(self.cache_folder, name)
+        temp_path = f"{path}.{threading.get_ident()}.part"
+
+        link_or_copy(file_path, temp_path)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            for old_name in [entry for entry in self._entries if entry.startswith(f"{file_id}-")]:
+                if old_name != name:
+                    self._remove(old_name)
+
+            self._size -= self._entries.pop(name, 0)
+            self._entries[name] = size
+            self._size += size
+            self._evict()
+
+    def _remove(self, name: str) -> None:
+        self._size -= self._entries.pop(name)
+        try:
+            os.remove(os.path.join(self.cache_folder, name))
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        while self._size > self.max_size and self._entries:
+            self._remove(next(iter(self._entries)))
@@ -1,6 +1,6 @@
-import datetime
-import io
 import os
+import tempfile
+import time
 
 from googleapiclient.discovery import Resource
 from googleapiclient.errors import HttpError
@@ -8,19 +8,31 @@ from googleapiclient.http import MediaIoBaseDownload
 
 from PIL import Image
 
-from error_handling import save_error_to_file, save_search_log_to_file
-from utils import get_default_folder_path
+from error_handling import log_search, save_error_to_file
+from utils import link_or_copy
 from ImageEdit import scale_image_to_cm
+from constants import DOWNLOAD_CHUNK_SIZE
+from instrumentation import RUN_STATS
+from .folder_cache import DESIGN_FOLDER_CACHE, DesignFolderCache
+from .scheduler import DRIVE_SCHEDULER
 
 
-def list_files(drive_service: Resource, drive_folder_id: str) -> list:
+# md5Checksum of found design is needed to take it from local DesignCache.
+SEARCH_FIELDS = "nextPageToken, files(id, name, md5Checksum)"
+
+
+def list_files(drive_service: Resource, drive_folder_id: str, catalog=None) -> list:
     """
     List all files inside given drive folder.
     :param drive_service: Google Drive API service
     :param drive_folder_id: Google Drive folder ID
+    :param catalog: optional DriveCatalog, used instead of Drive query if it has the folder indexed
     :return: list
     """
 
+    if catalog and catalog.has_folder(drive_folder_id):
+        return catalog.list_files(drive_folder_id)
+
     files = []
 
     query = f"'{drive_folder_id}' in parents and mimeType contains 'image/'"
@@ -28,7 +40,7 @@ def list_files(drive_service: Resource, drive_folder_id: str) -> list:
     try:
         page_token = None
         while True:
-            response = (
+            response = DRIVE_SCHEDULER.execute(
                 drive_service.files()
                 .list(
                     q=query,
@@ -36,7 +48,6 @@ def list_files(drive_service: Resource, drive_folder_id: str) -> list:
                     fields="nextPageToken, files(id, name)",
                     pageToken=page_token,
                 )
-                .execute()
             )
             for file in response.get("files", []):
                 print(f'Found file: {file.get("name")}')
@@ -52,14 +63,18 @@ def list_files(drive_service: Resource, drive_folder_id: str) -> list:
     return files
 
 
-def list_folders(drive_service: Resource, drive_folder_id: str) -> list:
+def list_folders(drive_service: Resource, drive_folder_id: str, catalog=None) -> list:
     """
     List all folders inside given drive folder.
     :param drive_service: Google Drive API service
     :param drive_folder_id: Google Drive folder ID
+    :param catalog: optional DriveCatalog, used instead of Drive query if it has the folder indexed
     :return: list
     """
 
+    if catalog and catalog.has_folder(drive_folder_id):
+        return catalog.list_folders(drive_folder_id)
+
     folders = []
 
     query = f"'{drive_folder_id}' in parents and mimeType='application/vnd.google-apps.folder'"
@@ -67,7 +82,7 @@ def list_folders(drive_service: Resource, drive_folder_id: str) -> list:
     try:
         page_token = None
         while True:
-            response = (
+            response = DRIVE_SCHEDULER.execute(
                 drive_service.files()
                 .list(
                     q=query,
@@ -75,7 +90,6 @@ def list_folders(drive_service: Resource, drive_folder_id: str) -> list:
                     fields="nextPageToken, files(id, name)",
                     pageToken=page_token,
                 )
-                .execute()
             )
             for folder in response.get("files", []):
                 print(f'Found folder: {folder.get("name")}')
@@ -91,11 +105,16 @@ def list_folders(drive_service: Resource, drive_folder_id: str) -> list:
 
 
 def find_folder_id_by_name(
-    drive_service: Resource, name: str, root_folder_id: str = None
+    drive_service: Resource, name: str, root_folder_id: str = None, catalog=None
 ) -> str:
     """
     Find drive folder id by given name. If root folder id not provided, it will not specify it in query.
+    If root folder is indexed in given DriveCatalog, search is done locally.
     """
+    if catalog and root_folder_id and catalog.has_folder(root_folder_id):
+        folder = catalog.find_folder_by_keywords([name], root_folder_id)
+        return folder["id"] if folder else None
+
     query_parts = {
         "parent": f"'{root_folder_id}' in parents",
         "folder_type": f"mimeType='application/vnd.google-apps.folder'",
@@ -111,7 +130,7 @@ def find_folder_id_by_name(
     try:
         page_token = None
         while True:
-            response = (
+            response = DRIVE_SCHEDULER.execute(
                 drive_service.files()
                 .list(
                     q=query,
@@ -119,7 +138,6 @@ def find_folder_id_by_name(
                     fields="nextPageToken, files(id, name)",
                     pageToken=page_token,
                 )
-                .execute()
             )
             for folder in response.get("files", []):
                 print(f'Found folder: {folder.get("name")}')
@@ -137,78 +155,145 @@ def find_folder_id_by_name(
 
 
 def map_folder_id_to_design(
-    drive_service: Resource, file_data_list: list, root_folder_id: str = None
+    drive_service: Resource,
+    file_data_list: list,
+    root_folder_id: str = None,
+    catalog=None,
+    folder_cache: DesignFolderCache = DESIGN_FOLDER_CACHE,
 ):
     """
-    Extend each item dictionary in list by design folder id.
+    Extend each item dictionary in list by design folder id. Each design is searched once, results are kept
+    in folder_cache for the whole run (and between runs if the cache has a file).
     """
     print("\nMapping folders to designs.")
-    previous_item = {}
 
     for item in file_data_list:
-        if previous_item.get("design") == item["design"]:
-            design_folder_id = previous_item["folder_id"]
+        if folder_cache.has(item["design"], root_folder_id):
+            design_folder_id = folder_cache.get(item["design"], root_folder_id)
         else:
             design_folder_id = find_folder_id_by_name(
                 drive_service=drive_service,
                 name=item["design"],
                 root_folder_id=root_folder_id,
+                catalog=catalog,
             )
+            folder_cache.set(item["design"], root_folder_id, design_folder_id)
 
         if design_folder_id:
             item["folder_id"] = design_folder_id
 
+    folder_cache.save()
+
+
+def make_temp_path(file_path: str) -> str:
+    """
+    Create unique temporary file next to file_path. Several workers may write the same output file at once (e.g. two
+    orders of the same design), each of them writes its own temporary file.
+    """
+    folder, file_name = os.path.split(file_path)
+    handle, temp_path = tempfile.mkstemp(dir=folder, prefix=f"{file_name}.", suffix=".part")
+    os.close(handle)
+    return temp_path
+
+
+def save_design(source_path: str, file_path: str, is_adult=True, keep_source=False) -> None:
+    """
+    Move downloaded design to its final path. Kids designs (not PDF) are scaled down on the way. Final file appears
+    only when it is complete.
+    :param source_path: path to downloaded file
+    :param file_path: final file path
+    :param keep_source: copy instead of move, used for files taken from cache
+    """
+    if not is_adult and '.pdf' not in file_path:
+        temp_path = make_temp_path(file_path)
+        with RUN_STATS.measure("resize") as stage:
+            # Image is opened lazily from disk, pixels are decoded only when thumbnail needs them.
+            with Image.open(source_path) as image:
+                image_format = image.format
+                image = scale_image_to_cm(image, max_width_cm=20, max_height_cm=25, dpi=300)
+                image.save(temp_path, format=image_format, dpi=(300, 300))
+            stage["bytes"] = os.path.getsize(temp_path)
+        os.replace(temp_path, file_path)
+        if not keep_source:
+            os.remove(source_path)
+    elif keep_source:
+        # Kids designs taken from cache are timed as resize above.
+        with RUN_STATS.measure("cache_hit"):
+            temp_path = make_temp_path(file_path)
+            link_or_copy(source_path, temp_path)
+            os.replace(temp_path, file_path)
+    else:
+        os.replace(source_path, file_path)
+
 
 def download_file_by_id(
-    drive_service, file_id: str, file_name: str, destination_folder: str, is_adult=True
-) -> None:
+    drive_service,
+    file_id: str,
+    file_name: str,
+    destination_folder: str,
+    is_adult=True,
+    http=None,
+    md5_checksum: str = None,
+    cache=None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+) -> bool:
     """
-    Downloads a file from Google Drive to given destination folder with given file name.
+    Downloads a file from Google Drive to given destination folder with given file name. File is streamed to
+    temporary file next to the destination and renamed when complete.
     :param drive_service: Google Drive API service
     :param file_id: Google Drive file ID
     :param file_name: local file name
     :param destination_folder: absolute path to destination folder e.g. E:\\SomeFolderName\\SomeFolderName
+    :param http: authorized http client to send the request with, required when called from worker threads
+    :param md5_checksum: Drive md5Checksum of the file, required to use cache
+    :param cache: optional DesignCache, file is taken from it if checksum matches and saved in it after download
+    :param chunk_size: size of single download request in bytes, max memory used for file content
+    :return: True if file was saved
     """
-    request = drive_service.files().get_media(fileId=file_id)
-    file = io.BytesIO()
-    downloader = MediaIoBaseDownload(fd=file, request=request)
     file_path = os.path.join(destination_folder, file_name)
 
+    cached_path = cache.get(file_id, md5_checksum) if cache and md5_checksum else None
+    if cached_path:
+        print(f"Found in cache - {file_name}")
+        save_design(cached_path, file_path, is_adult=is_adult, keep_source=True)
+        return True
+
+    request = drive_service.files().get_media(fileId=file_id)
+    if http:
+        request.http = http
+
+    temp_path = make_temp_path(file_path)
+
     done = False
 
     try:
-        while done is False:
-            status, done = downloader.next_chunk()
-            print(f"Download {int(status.progress() * 100)}% - {file_name}")
+        with RUN_STATS.measure("download") as stage, open(temp_path, "wb") as file:
+            downloader = MediaIoBaseDownload(fd=file, request=request, chunksize=chunk_size)
+            while done is False:
+                status, done = DRIVE_SCHEDULER.call(downloader.next_chunk, endpoint="drive.files.get_media")
+                print(f"Download {int(status.progress() * 100)}% - {file_name}")
+            stage["bytes"] = file.tell()
     except Exception as e:
-        save_error_to_file(
-            f"Download Error occurred for file: {file_name}.\nError message: {e}\n",
-            get_default_folder_path("Download_errors"),
-            datetime.datetime.now().strftime("%d-%m-%Y - %H%M%S"),
-        )
+        save_error_to_file(f"Download error: {e}", file_name=file_name, file_id=file_id)
 
-    file.seek(0)
-    if not is_adult and '.pdf' not in file_path:
-        image = Image.open(file)
-        image = scale_image_to_cm(image, max_width_cm=20, max_height_cm=25, dpi=300)
-        image.save(file_path, dpi=(300, 300))
-        return
+    if not done:
+        # Don't leave incomplete design in the output folder.
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
 
-    with open(file_path, "wb") as f:
-        f.write(file.read())
-    return
+    if cache and md5_checksum:
+        with RUN_STATS.measure("cache_put"):
+            cache.put(file_id, md5_checksum, temp_path)
 
+    save_design(temp_path, file_path, is_adult=is_adult)
+    return True
 
-def find_file_in_folder_by_keywords(drive_service: Resource, keywords: list, root_folder_id: str = None) -> dict:
-    """
-    Find file that contains keywords in name. If root folder id is provided it will narrow down search to specified
-    folder.
 
-    :return: dict, {"name": "file_name", "id": "file_id"}
+def build_keywords_query(keywords: list, root_folder_id: str = None) -> str:
+    """
+    Build files().list query for file which name contains all keywords.
     """
-
-    log = "\n"
-
     if not all(isinstance(keyword, str) for keyword in keywords):
         raise ValueError("Keywords must be a list of strings.")
 
@@ -221,48 +306,62 @@ def find_file_in_folder_by_keywords(drive_service: Resource, keywords: list, roo
     for i, keyword in enumerate(keywords):
         query_parts[f"keyword_{i}"] = f"name contains '{keyword}'"
 
-    query = " and ".join(query_parts.values())
+    return " and ".join(query_parts.values())
+
+
+def find_file_in_folder_by_keywords(
+    drive_service: Resource, keywords: list, root_folder_id: str = None, catalog=None
+) -> dict:
+    """
+    Find file that contains keywords in name. If root folder id is provided it will narrow down search to specified
+    folder. If the folder is indexed in given DriveCatalog, search is done locally.
+
+    :return: dict, {"name": "file_name", "id": "file_id"}
+    """
+
+    if catalog and catalog.has_folder(root_folder_id):
+        return catalog.find_file_by_keywords(keywords, root_folder_id)
+
+    started = time.perf_counter()
+    query = build_keywords_query(keywords, root_folder_id)
     code_name = "_".join(keywords)
 
     found_files = []
+    error_message = None
 
-    print(log_line := f"\nSearch for {code_name}...")
-    log += log_line
+    print(f"\nSearch for {code_name}...")
 
     try:
         page_token = None
         while True:
-            response = (
+            response = DRIVE_SCHEDULER.execute(
                 drive_service.files()
                 .list(
                     q=query,
                     spaces="drive",
-                    fields="nextPageToken, files(id, name)",
+                    fields=SEARCH_FIELDS,
                     pageToken=page_token,
                 )
-                .execute()
             )
             for folder in response.get("files", []):
-                print(log_line := f'Found file: {folder.get("name")}')
-                log += log_line
+                print(f'Found file: {folder.get("name")}')
             found_files.extend(response.get("files", []))
             page_token = response.get("nextPageToken", None)
             if page_token is None:
                 break
 
     except HttpError as error:
-        print(log_line := f"An error occurred: {error}")
-        log += log_line
+        print(error_message := f"An error occurred: {error}")
 
     if found_files:
         shortest_file = min(found_files, key=lambda x: len(x["name"]))
         shortest_file["name"] = shortest_file["name"].replace(" ", "_")
-        save_search_log_to_file(log, get_default_folder_path(), datetime.datetime.now().strftime("%d-%m-%Y - %H%M%S"))
-        return shortest_file
     else:
-        print(log_line := f"Not found {code_name}")
-        log += log_line
-        save_search_log_to_file(log, get_default_folder_path(), datetime.datetime.now().strftime("%d-%m-%Y - %H%M%S"))
+        shortest_file = None
+        print(f"Not found {code_name}")
+
+    log_search(query, found_files, shortest_file, started, error=error_message)
+    return shortest_file
 
 
 def find_file_in_folder(
@@ -294,15 +393,14 @@ def find_file_in_folder(
     try:
         page_token = None
         while True:
-            response = (
+            response = DRIVE_SCHEDULER.execute(
                 drive_service.files()
                 .list(
                     q=query,
                     spaces="drive",
-                    fields="nextPageToken, files(id, name)",
+                    fields=SEARCH_FIELDS,
                     pageToken=page_token,
                 )
-                .execute()
             )
             for folder in response.get("files", []):
                 print(f'Found file: {folder.get("name")}')
@@ -321,14 +419,21 @@ def find_file_in_folder(
 
 
 def recursive_find_file_id_in_folder(
-    drive_service: Resource, design: str, endcode: str, root_folder_id: str = None
+    drive_service: Resource, design: str, endcode: str, root_folder_id: str = None, catalog=None
 ):
-    file_data = find_file_in_folder(drive_service, design, endcode, root_folder_id)
+    """
+    Depth first search of file by design and endcode in folder and its subfolders. Folders indexed in given
+    DriveCatalog (see crawl_folder_tree) are searched locally.
+    """
+    if catalog and catalog.has_folder(root_folder_id):
+        file_data = catalog.find_image_by_keywords([design, endcode], root_folder_id)
+    else:
+        file_data = find_file_in_folder(drive_service, design, endcode, root_folder_id)
     if not file_data:
-        folders = list_folders(drive_service, root_folder_id)
+        folders = list_folders(drive_service, root_folder_id, catalog=catalog)
         for folder in folders:
             file_data = recursive_find_file_id_in_folder(
-                drive_service, design, endcode, folder["id"]
+                drive_service, design, endcode, folder["id"], catalog=catalog
             )
             if file_data:
                 break
@@ -0,0 +1,75 @@
+import json
+import os
+import threading
+
+from constants import DESIGN_FOLDER_CACHE_FILE
+
+
+class DesignFolderCache:
+    """
+    Results of design folder lookups (design name inside root folder -> Drive folder id), shared by the whole run so
+    each design is searched once no matter how the list is sorted. If file path is given, found folders are saved
+    in JSON file and reused by next runs. Not found designs are remembered only for the current run.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        :param path: absolute path to JSON file, cache is kept in memory only if None
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._folders = {}  # "root_folder_id/design" -> folder id or None if not found
+        self._changed = False
+
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._folders.update(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Could not read design folder cache {path}: {e}")
+
+    @staticmethod
+    def _key(design: str, root_folder_id: str = None) -> str:
+        return f"{root_folder_id or ''}/{design}"
+
+    def has(self, design: str, root_folder_id: str = None) -> bool:
+        with self._lock:
+            return self._key(design, root_folder_id) in self._folders
+
+    def get(self, design: str, root_folder_id: str = None) -> str:
+        with self._lock:
+            return self._folders.get(self._key(design, root_folder_id))
+
+    def set(self, design: str, root_folder_id: str, folder_id: str) -> None:
+        with self._lock:
+            self._folders[self._key(design, root_folder_id)] = folder_id
+            self._changed = True
+
+    def start_run(self) -> None:
+        """
+        Forget designs not found by previous runs of the process, their folders may have been created since.
+        """
+        with self._lock:
+            self._folders = {key: folder_id for key, folder_id in self._folders.items() if folder_id}
+
+    def save(self) -> None:
+        """
+        Write found folders to JSON file. File is replaced at once, so it is never left half written.
+        """
+        if not self.path:
+            return
+
+        with self._lock:
+            if not self._changed:
+                return
+            folders = {key: folder_id for key, folder_id in self._folders.items() if folder_id}
+            self._changed = False
+
+        temp_path = f"{self.path}.part"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(folders, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+# Shared by the whole run.
+DESIGN_FOLDER_CACHE = DesignFolderCache(DESIGN_FOLDER_CACHE_FILE)
@@ -0,0 +1,158 @@
+import random
+import threading
+import time
+from collections import Counter
+
+from googleapiclient.errors import HttpError
+
+from constants import DRIVE_MAX_RETRIES, DRIVE_QUERIES_PER_SECOND
+
+
+# Drive answers 403 instead of 429 when user or project quota is used up.
+RATE_LIMIT_REASONS = ("ratelimitexceeded", "userratelimitexceeded", "quotaexceeded")
+
+
+def is_retryable(status: int, content=b"") -> bool:
+    """
+    Check if failed Drive request may succeed when sent again: rate limit (429 or 403 with rate limit reason)
+    or server error (5xx).
+    """
+    if status == 429 or status >= 500:
+        return True
+    if status == 403:
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", errors="replace")
+        content = content.lower()
+        return any(reason in content for reason in RATE_LIMIT_REASONS)
+    return False
+
+
+def is_retryable_error(error) -> bool:
+    return isinstance(error, HttpError) and is_retryable(error.resp.status, error.content)
+
+
+class RequestScheduler:
+    """
+    Central gate for Drive requests. Keeps request rate within queries per second budget (token bucket) and sends
+    requests again with jittered exponential backoff when Drive answers with rate limit or server error.
+    Thread safe. Async code takes the wait time from reserve and sleeps itself.
+    """
+
+    def __init__(
+        self,
+        queries_per_second: float = DRIVE_QUERIES_PER_SECOND,
+        burst: int = None,
+        max_retries: int = DRIVE_MAX_RETRIES,
+        base_delay: float = 1.0,
+        max_delay: float = 32.0,
+    ):
+        """
+        :param queries_per_second: request budget, 0 turns rate limiting off
+        :param burst: number of requests which can be sent at once after idle time, defaults to 1 second budget
+        :param max_retries: how many times a failed request is sent again
+        :param base_delay: first backoff delay in seconds, doubled with each retry
+        :param max_delay: max backoff delay in seconds
+        """
+        self.queries_per_second = queries_per_second
+        self.burst = burst or max(1, int(queries_per_second))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.endpoints = Counter()  # API calls by endpoint, e.g. "drive.files.list"
+
+    def count(self, name: str, value=1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def count_endpoint(self, endpoint: str, calls: int = 1) -> None:
+        with self._lock:
+            self.endpoints[endpoint or "unknown"] += calls
+
+    def get_counters(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+    def get_endpoints(self) -> dict:
+        with self._lock:
+            return dict(self.endpoints)
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.endpoints.clear()
+
+    def reserve(self, cost: int = 1) -> float:
+        """
+        Take cost tokens from the bucket. Tokens may be taken in advance, the caller must wait returned time
+        before sending the request.
+
+        :return: seconds to wait
+        """
+        with self._lock:
+            self.counters["requests"] += cost
+            if not self.queries_per_second:
+                return 0.0
+
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.queries_per_second)
+            self._updated = now
+            self._tokens -= cost
+
+            if self._tokens >= 0:
+                return 0.0
+            wait = -self._tokens / self.queries_per_second
+            self.counters["throttle_waits"] += 1
+            self.counters["throttle_wait_seconds"] += wait
+            return wait
+
+    def acquire(self, cost: int = 1) -> None:
+        wait = self.reserve(cost)
+        if wait:
+            time.sleep(wait)
+
+    def get_backoff(self, attempt: int) -> float:
+        """
+        Backoff delay before given retry ("full jitter" - random time up to exponential limit).
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        with self._lock:
+            self.counters["retries"] += 1
+            self.counters["backoff_seconds"] += delay
+        return delay
+
+    def call(self, function, *args, cost: int = 1, endpoint: str = None, **kwargs):
+        """
+        Call function which sends Drive request(s), e.g. HttpRequest.execute or MediaIoBaseDownload.next_chunk.
+        Retryable HttpErrors are retried, other errors and the last failure are raised.
+
+        :param endpoint: API method counted for every attempt, e.g. "drive.files.list"
+        """
+        attempt = 0
+        while True:
+            self.acquire(cost)
+            if endpoint:
+                self.count_endpoint(endpoint, cost)
+            try:
+                return function(*args, **kwargs)
+            except HttpError as error:
+                if attempt >= self.max_retries or not is_retryable_error(error):
+                    self.count("failed")
+                    raise
+                print(f"Drive request failed with {error.resp.status}, retrying...")
+                time.sleep(self.get_backoff(attempt))
+                attempt += 1
+
+    def execute(self, request, cost: int = 1):
+        """
+        Execute googleapiclient request (or batch of cost requests).
+        """
+        return self.call(request.execute, cost=cost, endpoint=getattr(request, "methodId", None) or "unknown")
+
+
+# Shared by all Drive calls of the app, so the budget is kept across threads.
+DRIVE_SCHEDULER = RequestScheduler()
@@ -1,56 +1,138 @@
+import asyncio
 import time
 
-from datetime import datetime
-
-from Google import get_service
+from Google import get_oauth_credentials, get_service
 from DriveAPI import (
+    DESIGN_FOLDER_CACHE,
+    AsyncDriveClient,
+    CatalogStore,
+    DesignCache,
+    DriveCatalog,
+    crawl_folder_tree,
+    get_catalog_store_path,
     recursive_find_file_id_in_folder,
     map_folder_id_to_design,
     download_file_by_id,
 )
 from utils import list_file_data_from_csv, get_default_folder_path
-from constants import DOWNLOAD_DESIGNS_FOLDER_ID
+from constants import ASYNC_DRIVE, DESIGN_CACHE_FOLDER, DESIGN_CACHE_MAX_MB, DOWNLOAD_DESIGNS_FOLDER_ID
 from error_handling import save_error_to_file, save_list_to_csv
 
 
-def download_listed_files(csv_file_path: str, drive_folder_id: str):
+def download_listed_files(csv_file_path: str, drive_folder_id: str, use_async: bool = ASYNC_DRIVE):
     """
     Download designs from CSV file.
     :param csv_file_path: Absolute path to CSV file with listed designs.
     :param drive_folder_id: Drive folder id to specify where to search for files.
+    :param use_async: search and download all designs at the same time with AsyncDriveClient
     """
-    drive_service = get_service()
     file_data_list = list_file_data_from_csv(csv_file_path)
-    map_folder_id_to_design(drive_service, file_data_list, drive_folder_id)
-
     folder_path = get_default_folder_path()
-    missing_files = []
-
-    print("\nDownload files")
-    for item in file_data_list:
-        item_name = f"{item['design']}_{item['endcode']}"
-        print(f"Processing {item_name}")
-        if not item.get("folder_id"):
-            print(f"No folder found for {item_name}")
-            continue
-        file_data = recursive_find_file_id_in_folder(
-            drive_service, item["design"], item["endcode"], item.get("folder_id")
+    DESIGN_FOLDER_CACHE.start_run()
+
+    cache = None
+    if DESIGN_CACHE_MAX_MB > 0:
+        cache = DesignCache(DESIGN_CACHE_FOLDER, DESIGN_CACHE_MAX_MB * 1024 * 1024)
+
+    if use_async:
+        missing_files = asyncio.run(
+            download_listed_files_async(file_data_list, drive_folder_id, folder_path, cache=cache)
+        )
+        save_list_to_csv(missing_files, get_default_folder_path(), "missing_files.csv")
+        return
+
+    credentials = get_oauth_credentials()
+    drive_service = get_service(credentials)
+    with CatalogStore(get_catalog_store_path()) as store:
+        catalog = DriveCatalog(drive_service, store)
+        catalog.load_folders([drive_folder_id])
+        map_folder_id_to_design(drive_service, file_data_list, drive_folder_id, catalog=catalog)
+
+        # Design folder trees are listed level by level up front, designs are then searched in memory.
+        crawl_folder_tree(
+            drive_service,
+            [item["folder_id"] for item in file_data_list if item.get("folder_id")],
+            catalog,
+            credentials=credentials,
         )
-        if file_data:
-            download_file_by_id(
-                drive_service,
-                file_data["id"],
-                file_data["name"],
-                folder_path,
+
+        missing_files = []
+
+        print("\nDownload files")
+        for item in file_data_list:
+            item_name = f"{item['design']}_{item['endcode']}"
+            print(f"Processing {item_name}")
+            if not item.get("folder_id"):
+                print(f"No folder found for {item_name}")
+                continue
+            file_data = recursive_find_file_id_in_folder(
+                drive_service, item["design"], item["endcode"], item.get("folder_id"), catalog=catalog
             )
-        else:
+            if file_data:
+                saved = download_file_by_id(
+                    drive_service,
+                    file_data["id"],
+                    file_data["name"],
+                    folder_path,
+                    md5_checksum=file_data.get("md5Checksum"),
+                    cache=cache,
+                )
+                if not saved:
+                    missing_files.append(item_name)
+            else:
+                message = f"Not found {item_name}"
+                print(message)
+                save_error_to_file(message, design=item["design"], endcode=item["endcode"])
+                missing_files.append(item_name)
+
+    save_list_to_csv(missing_files, get_default_folder_path(), "missing_files.csv")
+
+
+async def download_listed_files_async(file_data_list: list, drive_folder_id: str, folder_path: str, cache=None):
+    """
+    Async version of download_listed_files. Each design folder is looked up once, all listed designs are searched
+    and downloaded at the same time.
+
+    :return: list of missing file names, in csv order
+    """
+    async with AsyncDriveClient(get_oauth_credentials()) as client:
+        folder_tasks = {}
+
+        async def download(item):
+            item_name = f"{item['design']}_{item['endcode']}"
+            print(f"Processing {item_name}")
+
+            if DESIGN_FOLDER_CACHE.has(item["design"], drive_folder_id):
+                folder_id = DESIGN_FOLDER_CACHE.get(item["design"], drive_folder_id)
+            else:
+                if item["design"] not in folder_tasks:
+                    folder_tasks[item["design"]] = asyncio.ensure_future(
+                        client.find_folder_id_by_name(item["design"], drive_folder_id)
+                    )
+                folder_id = await folder_tasks[item["design"]]
+                DESIGN_FOLDER_CACHE.set(item["design"], drive_folder_id, folder_id)
+            if not folder_id:
+                print(f"No folder found for {item_name}")
+                return None
+
+            file_data = await client.recursive_find_file(item["design"], item["endcode"], folder_id)
+            if file_data:
+                saved = await client.download_file(
+                    file_data["id"],
+                    file_data["name"],
+                    folder_path,
+                    md5_checksum=file_data.get("md5Checksum"),
+                    cache=cache,
+                )
+                return None if saved else item_name
+
             message = f"Not found {item_name}"
             print(message)
-            save_error_to_file(
-                message,
-                folder_path,
-                datetime_string=datetime.now().strftime("%d-%m-%Y - %H%M%S"),
-            )
-            missing_files.append(item_name)
+            save_error_to_file(message, design=item["design"], endcode=item["endcode"])
+            return item_name
 
-    save_list_to_csv(missing_files, get_default_folder_path(), "missing_files.csv")
+        results = await asyncio.gather(*(download(item) for item in file_data_list))
+
+    DESIGN_FOLDER_CACHE.save()
+
+    return [item_name for item_name in results if item_name]
@@ -1,7 +1,10 @@
 import pickle
 import os
 import sys
+import threading
 
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
@@ -11,8 +14,10 @@ from utils import resource_path
 from constants import API_NAME, API_VERSION, SCOPES
 
 
-def create_service(client_secret_file, api_name, api_version, *scopes):
-    print(client_secret_file, api_name, api_version, scopes, sep="-")
+_thread_local = threading.local()
+
+
+def load_credentials(client_secret_file, api_name, api_version, *scopes):
     scopes = [scope for scope in scopes[0]]
 
     cred = None
@@ -33,6 +38,17 @@ def create_service(client_secret_file, api_name, api_version, *scopes):
         with open(pickle_file, "wb") as token:
             pickle.dump(cred, token)
 
+    return cred
+
+
+def create_service(client_secret_file, api_name, api_version, *scopes, credentials=None):
+    """
+    :param credentials: credentials from load_credentials, loaded here if not given. Pass them when the same
+        credentials are used by other clients too (see get_thread_http), so the token is loaded and refreshed once.
+    """
+    print(client_secret_file, api_name, api_version, scopes, sep="-")
+    cred = credentials or load_credentials(client_secret_file, api_name, api_version, *scopes)
+
     try:
         service = build(api_name, api_version, credentials=cred, static_discovery=False)
         print(api_name, "service created successfully")
@@ -41,8 +57,28 @@ def create_service(client_secret_file, api_name, api_version, *scopes):
         raise Exception(e)
 
 
-def get_service():
-    return create_service(get_credentials(), API_NAME, API_VERSION, SCOPES)
+def get_thread_http(credentials):
+    """
+    Return authorized http client owned by the current thread. Shared service objects are not thread-safe, so each
+    download worker sends its requests through its own httplib2 connection.
+    """
+    http = getattr(_thread_local, "http", None)
+    # Worker threads outlive a run, a client made for credentials of an earlier run is replaced.
+    if http is None or http.credentials is not credentials:
+        http = AuthorizedHttp(credentials, http=httplib2.Http())
+        _thread_local.http = http
+    return http
+
+
+def get_service(credentials=None):
+    return create_service(get_credentials(), API_NAME, API_VERSION, SCOPES, credentials=credentials)
+
+
+def get_oauth_credentials():
+    """
+    OAuth credentials used by get_service, for clients which don't use googleapiclient, e.g. AsyncDriveClient.
+    """
+    return load_credentials(get_credentials(), API_NAME, API_VERSION, SCOPES)
 
 
 def convert_to_RFC_datetime(year=1900, month=1, day=1, hour=0, minute=0):
@@ -1,7 +1,18 @@
 from PIL import Image
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime
+import math
 import os
 
+from constants import MERGE_MEMORY_MB, MERGE_WORKERS, ROLL_WIDTH_CM, SHEET_HEIGHT_CM, SHEET_WIDTH_CM
+from PngWriter import PngStreamWriter
+from profiling import profiled
+from SheetLayout import Design, get_utilization, pack_row, pack_sheets
+
+
+# 200 dpi
+PX_PER_CM = 37.8 / 0.48
+
 
 def scale_image(image, target_height, max_scale_factor):
     original_width, original_height = image.size
@@ -36,98 +47,256 @@ def scale_image_to_cm(
     return image
 
 
-def merge_images(images, output_path, target_height_cm=30, spacing_cm=1):
-    target_height = int((target_height_cm * 37.8) / 0.48)
-    spacing = int((spacing_cm * 37.8) / 0.48)
+def get_thumbnail_size(size, max_size):
+    """
+    Size of image after Image.thumbnail(max_size), computed without decoding the image.
+    """
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
 
-    total_images = len(images)
-    total_spacing = (total_images - 1) * spacing
+    width, height = size
+    x, y = map(math.floor, max_size)
+    if x >= width and y >= height:
+        return size
+
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
 
-    total_width = 0
 
-    image_heights = []
-    rotated_images = []
+def cm_to_px(cm):
+    return int((cm * 37.8) / 0.48)
 
-    list_of_images = []
+
+def get_merge_layout(images, target_height):
+    """
+    Plan designs from image headers only: which images are rotated and their size on the sheet.
+
+    :return: list of SheetLayout.Design
+    """
+    layout = []
 
     for image_path in images:
-        file_name = image_path.split("/")[-1]
-        image = Image.open(image_path)
-        image_width, image_height = image.size
+        with Image.open(image_path) as image:
+            original_size = image.size
 
-        if image_width > image_height:
-            image = image.rotate(90, expand=True)
-            image_width, image_height = image.size
+        image_width, image_height = original_size
+        rotate = image_width > image_height
+        if rotate:
+            image_width, image_height = image_height, image_width
 
         if image_height > target_height:
-            image.thumbnail([target_height, target_height])
-            image_width, image_height = image.size
-            total_width += image_width
-            list_of_images.append(image)
-
+            size = get_thumbnail_size((image_width, image_height), (target_height, target_height))
         elif image_height < target_height:
-            bigger_image = scale_image(image, target_height, 1.3)
-            if bigger_image:
-                image_width, image_height = bigger_image.size
-                total_width += image_width
-                list_of_images.append(bigger_image)
-            else:
-                print(f"Plik {file_name} jest zbyt mały aby go powiększyć.")
-
+            # same as scale_image
+            max_width = image_width * (target_height / image_height)
+            size = get_thumbnail_size((image_width, image_height), (min(image_width * 1.3, max_width), target_height))
         else:
-            list_of_images.append(image)
+            size = (image_width, image_height)
+
+        layout.append(Design(image_path, size[0], size[1], rotate, original_size))
+
+    return layout
 
-    total_width += total_spacing
 
-    merged_image = Image.new(
-        "RGBA", (int(total_width), int(target_height)), (0, 0, 0, 0)
+def estimate_merge_memory(sheet, roll=False):
+    """
+    Estimate peak memory of merge_sheet in bytes: RGBA sheet and the largest design decoded with its rotated copy.
+    :param roll: estimate for merge_roll_sheet, which keeps only the highest shelf instead of the whole sheet
+        (and its filtered copies while it is written)
+    """
+    largest_image = max(
+        (placement.design.original_size[0] * placement.design.original_size[1] for placement in sheet.placements),
+        default=0,
     )
+    if roll:
+        band = sheet.width * max((shelf.height for shelf in sheet.shelves), default=0)
+        # PngStreamWriter filters the shelf with 3 more copies of it, designs are closed by then.
+        return max(band + 2 * largest_image, 4 * band) * 4
+    return (sheet.width * sheet.height + 2 * largest_image) * 4
 
-    x_offset = 0
-    for image in list_of_images:
-        image_width, image_height = image.size
 
-        merged_image.paste(image, (int(x_offset), 0), mask=image)
+def open_design(design, target_height):
+    """
+    Decode design image rotated and scaled as planned by get_merge_layout.
+    """
+    image = Image.open(design.path)
 
-        x_offset += image_width + spacing
+    if design.rotate:
+        # transpose doesn't resample, same result as rotate(90, expand=True)
+        rotated_image = image.transpose(Image.Transpose.ROTATE_90)
+        image.close()
+        image = rotated_image
 
-    merged_image.save(output_path, dpi=(200, 200))
+    image_width, image_height = image.size
+    if image_height > target_height:
+        image.thumbnail([target_height, target_height])
+    elif image_height < target_height:
+        image = scale_image(image, target_height, 1.3)
 
+    return image
+
+
+def merge_sheet(sheet, output_path, target_height_cm=30):
+    """
+    Render SheetLayout.Sheet to PNG file. Only one design is decoded at a time.
+    """
+    target_height = cm_to_px(target_height_cm)
+
+    merged_image = Image.new("RGBA", (sheet.width, sheet.height), (0, 0, 0, 0))
+
+    for placement in sheet.placements:
+        image = open_design(placement.design, target_height)
+        merged_image.paste(image, (placement.x, placement.y), mask=image)
+
+        # Free decoded image before the next one is opened.
+        image.close()
+        del image
+
+    merged_image.save(output_path, dpi=(200, 200))
 
-def split_list(list, size=6):
-    return [list[i: i + size] for i in range(0, len(list), size)]
 
+def merge_roll_sheet(sheet, output_path, target_height_cm=30):
+    """
+    Write SheetLayout.Sheet to PNG file shelf by shelf. Only one shelf of designs is in memory, so a roll of any
+    length can be written.
+    """
+    target_height = cm_to_px(target_height_cm)
 
-# Na podstawie wskazanej ścieżki, tworzy listę list plików png dzieląc je na chunki (6 plików)
-def list_files_as_chunk(folder_path):
-    list_of_files = os.listdir(folder_path)
-    images_list = []
+    with PngStreamWriter(output_path, sheet.width, sheet.height, dpi=(200, 200)) as writer:
+        for shelf in sheet.shelves:
+            # spacing between shelves
+            writer.write_empty_rows(shelf.y - writer.rows_written)
 
-    for i, f in enumerate(list_of_files):
-        if f.endswith(".png"):
-            full_path = os.path.join(folder_path, f)
-            images_list.append(full_path)
+            band = Image.new("RGBA", (sheet.width, shelf.height), (0, 0, 0, 0))
+            for placement in sheet.get_shelf_placements(shelf):
+                image = open_design(placement.design, target_height)
+                band.paste(image, (placement.x, 0), mask=image)
+                image.close()
+                del image
 
-    chunk_list = split_list(images_list)
-    return chunk_list
+            writer.write_image(band)
+            del band
 
 
-def merge(origin_folder, destination_folder):
+def merge_images(images, output_path, target_height_cm=30, spacing_cm=1):
+    """
+    Merge images into a sheet with one row of designs, in given order.
+    """
+    target_height = cm_to_px(target_height_cm)
+    layout = get_merge_layout(images, target_height)
+    merge_sheet(pack_row(layout, cm_to_px(spacing_cm), target_height), output_path, target_height_cm)
+
+
+def list_png_files(folder_path):
+    return [
+        os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith(".png")
+    ]
+
+
+@profiled
+def merge(
+    origin_folder,
+    destination_folder,
+    workers=MERGE_WORKERS,
+    progress=None,
+    memory_mb=MERGE_MEMORY_MB,
+    sheet_width_cm=SHEET_WIDTH_CM,
+    sheet_height_cm=SHEET_HEIGHT_CM,
+    roll_width_cm=ROLL_WIDTH_CM,
+):
+    """
+    Merge PNG files from origin folder into sheets saved in destination folder. Designs are packed into as few
+    sheets of sheet_width_cm x sheet_height_cm as possible (see SheetLayout.pack_sheets). Sheets are merged in
+    parallel by worker processes, each sheet is independent.
+    :param workers: number of processes, 1 merges sheets one by one in current process
+    :param progress: optional function called with (merged sheets count, all sheets count) after each sheet
+    :param memory_mb: memory budget of sheets merged at the same time, 0 for no limit. A sheet is started only when
+        its estimate fits in the budget left, one sheet is always merged even if it exceeds the budget.
+    :param sheet_width_cm: max sheet width, sheet is cut after the last design
+    :param sheet_height_cm: sheet height
+    :param roll_width_cm: if set, designs are merged into one continuous roll of this width instead of sheets,
+        roll is written shelf by shelf (see merge_roll_sheet)
+    :return: number of merged designs
+    """
     target_height = 30  # 30 cm w dpi (37.8 piksela/cm)
     spacing = 1  # Odstęp między obrazami w cm
 
-    chunk_list = list_files_as_chunk(origin_folder)
-    designs_count = 0
+    images = list_png_files(origin_folder)
+
+    # Sizes of all designs are read from headers, so designs can be packed before any of them is decoded.
+    layout = get_merge_layout(images, cm_to_px(target_height))
+    if roll_width_cm:
+        # Designs wider than the roll get sheets of their own.
+        sheets = pack_sheets(layout, cm_to_px(roll_width_cm), None, cm_to_px(spacing))
+        merge_function = merge_roll_sheet
+    else:
+        sheets = pack_sheets(layout, cm_to_px(sheet_width_cm), cm_to_px(sheet_height_cm), cm_to_px(spacing))
+        merge_function = merge_sheet
+    report_sheets_utilization(sheets)
 
     dt_string = datetime.now().strftime("%d-%m-%Y - %H%M%S")
 
-    for i, chunk in enumerate(chunk_list):
-        designs_count += len(chunk)
+    sheet_files = []
+    for i, sheet in enumerate(sheets):
         save_folder = os.path.join(
             destination_folder, f"{i+1}__{dt_string}.png")
-        merge_images(chunk, save_folder, target_height, spacing)
-
-    return designs_count
+        sheet_files.append((sheet, save_folder))
+
+    if workers <= 1 or len(sheet_files) <= 1:
+        for i, (sheet, save_folder) in enumerate(sheet_files):
+            merge_function(sheet, save_folder, target_height)
+            report_merge_progress(i + 1, len(sheet_files), progress)
+        return len(images)
+
+    memory_budget = memory_mb * 1024 * 1024
+    waiting = [
+        (sheet, save_folder, estimate_merge_memory(sheet, roll=bool(roll_width_cm)))
+        for sheet, save_folder in sheet_files
+    ]
+    waiting.reverse()
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(sheet_files))) as executor:
+        running = {}  # future -> memory estimate
+        done_count = 0
+
+        while waiting or running:
+            # Start next sheets in order while they fit in workers and memory budget.
+            while waiting and len(running) < workers:
+                sheet, save_folder, memory = waiting[-1]
+                if running and memory_budget and sum(running.values()) + memory > memory_budget:
+                    break
+                waiting.pop()
+                running[executor.submit(merge_function, sheet, save_folder, target_height)] = memory
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                del running[future]
+                # Error of any sheet stops merging, same as in one by one mode.
+                future.result()
+                done_count += 1
+                report_merge_progress(done_count, len(sheet_files), progress)
+
+    return len(images)
+
+
+def report_sheets_utilization(sheets):
+    for i, sheet in enumerate(sheets, start=1):
+        print(
+            f"Arkusz {i}: {len(sheet.placements)} wzorów, "
+            f"{sheet.width / PX_PER_CM:.1f} x {sheet.height / PX_PER_CM:.1f} cm, "
+            f"wykorzystanie {sheet.utilization:.0%}"
+        )
+    print(f"Arkusze: {len(sheets)}, wykorzystanie {get_utilization(sheets):.0%}")
+
+
+def report_merge_progress(done_count, sheets_count, progress=None):
+    print(f"Połączono arkusz {done_count}/{sheets_count}")
+    if progress:
+        progress(done_count, sheets_count)
 
 
 if __name__ == "__main__":
@@ -1,18 +1,38 @@
+import asyncio
 import csv
 import os
-import re
 import sys
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from dotenv import load_dotenv
 from contextlib import suppress
 
-from Google import create_service
-from DriveAPI import download_file_by_id, find_file_in_folder_by_keywords
-from error_handling import save_error_to_file, save_search_log_to_file
+from Google import create_service, get_thread_http, load_credentials
+from DriveAPI import (
+    AsyncDriveClient,
+    DRIVE_SCHEDULER,
+    CatalogStore,
+    DesignCache,
+    DriveCatalog,
+    batch_find_files_by_keywords,
+    download_file_by_id,
+    find_file_in_folder_by_keywords,
+    get_catalog_store_path,
+)
+from error_handling import log_search, save_error_to_file
+from RunLogger import RUN_LOG
+from instrumentation import RUN_STATS
+from profiling import profiled
 from constants import (
+    ASYNC_DRIVE,
     CONTRACTOR,
-    SMALL_SIZES,
-    PRODUCTS,
+    FAKTORIA_COPY_MODE,
+    DESIGN_CACHE_FOLDER,
+    DESIGN_CACHE_MAX_MB,
+    DOWNLOAD_WORKERS,
     WHITE_SHIRT_FOLDER_ID,
     WHITE_CUP_FOLDER_ID,
     BLACK_SHIRT_FOLDER_ID,
@@ -20,7 +40,18 @@ from constants import (
     BLACK_HALFTONE_SHIRT_FOLDER_ID,
     GOLD_CUP_FOLDER_ID,
 )
-from utils import resource_path
+from utils import copy_file, detect_encoding, resource_path
+from SkuParser import (
+    SKU_PARSER,
+    get_code,
+    get_design,
+    get_design_color,
+    get_design_endcode,
+    get_file_type,
+    get_product_type,
+    is_adult,
+    shorten_design,
+)
 
 load_dotenv()
 
@@ -37,121 +68,100 @@ def find_csv_file():
     return None
 
 
-# transform sku to code.
-def get_code(sku):
-    regex_filter = re.compile(
-        "(KOSZ_MES_B|KOSZ_MES_C|KOSZ_DAM_B|KOSZ_DAM_C|KOSZ_DZIEC_CHLOP_B|KOSZ_DZIEC_CHLOP_C|KOSZ_DZIEC_DZIEW_B"
-        "|KOSZ_DZIEC_DZIEW_C|KOSZ_DZIEC_B|KOSZ_DZIEC_C|KB_ZW|1KB_ZW|2KB_ZW|1_KB_ZW|2_KB_ZW|V1_KB_ZW|V2_KB_ZW|KB_MAG"
-        "|1KB_MAG|2KB_MAG|V1_KB_MAG|V2_KB_MAG|V1_KB_FUN_C|V2_KB_FUN_C|KB_FUN_C|KB_GOLD_GD|1POD_ZW|2POD_ZW|POD_ZW|V1_POD_ZW"
-        "|V2_POD_ZW|V1_LEZA|V2_LEZA|LEZA|_XS_|_S_|_M_|_L_|_XL_|_XXL_|_3-4_|_5-6_|_7-8_|_9-11_|_12-14_)"
-    )
-
-    code = regex_filter.sub("", sku)
-    code = re.sub(r"_XS$|_S$|_M$|_L$|_XL$|_XXL$|_3-4|_5-6|_7-8|_9-11|_12-14$", "", code)
-    code = re.sub(r"^_B_|^_C_", "", code)
-    code = re.sub(r"^_|_$", "", code)
-    code = re.sub(r"_H999", "", code)
-    return code
-
-
-# transform code to design
-def get_design(code):
-    design = re.sub(r"_[0-9]{2,4}[BC]", "", code)
-    design = re.sub(r"\b\d{2}[BC]\b|\d{2}[BC]\b|\b\d{2}[BC]", "", design)
-
-    return design
-
-
-# returns design endcode:    PSY_LZ_TOARG_04C ===> 04C
-def get_design_endcode(code):
-    suffix = re.search(r"\d{2,4}[A-Z]", code)
-
-    if suffix:
-        text = suffix.group(0)
-        return text
+# returns destination folder string
+def get_destination_folder(product_type, adult, design_color):
+    # Create Different folder for KUBKI, KOSZ, and KOSZ_DZIEC for sizes: 3-4, 5-6, 7-8
+    if product_type == "KOSZ":
+        if not adult:
+            if design_color == "black_ht":
+                return "HALFTONE_KOSZ_DZIECIECE"
+            return "KOSZ_DZIECIECE"
+        if design_color == "black_ht":
+            return "HALFTONE_KOSZ_DOROSLI"
+        return "KOSZ_DOROSLI"
+    elif product_type in ["KB_ZW", "KB_FUN", "KB_MAG", "KB_GOLD"]:
+        return "Kubki"
     else:
-        return None
-
-
-# shorten design by one part:  PSY_LZ_TOARG ===> PSY_LZ
-def shorten_design(design):
-    parts = design.split("_")
-    if len(parts) <= 1:
-        return None
-
-    short_design = "_".join(parts[:-1])
-    return short_design
-
-
-# get product type:  KB_MAG_PSY_LZ_TOARG_04C ===> KB_MAG
-def get_product_type(sku):
-    products = ["LEZA", "KOSZ", "POD", "KB_ZW", "KB_MAG", "KB_FUN", "KB_GOLD"]
-
-    for product in products:
-        if re.search(product, sku):
-            return product
-    return None
+        return product_type
 
 
-# get file type to download: "pdf" or "png"
-def get_file_type(product_type):
-    if product_type in ["LEZA", "KOSZ", "POD"]:
-        file_type = ".png"
-        return file_type
-    elif product_type in ["KB_ZW", "KB_MAG", "KB_FUN", "KB_GOLD"]:
-        file_type = ".pdf"
-        return file_type
+# returns category folder path relative to the output folder
+def get_category_path(destination_folder, design_color):
+    if destination_folder == "Kubki":
+        if CONTRACTOR == "FAKTORIA":
+            return "Kubki"
+        return os.path.join("Kubki", design_color or "")
+    elif destination_folder == "LEZA":
+        return os.path.join("black", "Lezaki")
     else:
-        return None
-
-
-def find_file_id(drive_service, keywords, root_folder_id):
-    file_data = find_file_in_folder_by_keywords(
-        drive_service=drive_service, keywords=keywords, root_folder_id=root_folder_id
-    )
-
-    if file_data:
-        return file_data["id"], file_data["name"]
-
-    return None, None
+        return os.path.join(design_color or "", destination_folder)
 
 
 class Order:
-    drive_service = None
+    # Orders are created for every row of a monthly export, slots keep them small.
+    __slots__ = (
+        "order_id",
+        "quantity",
+        "sku",
+        "first_code",
+        "code",
+        "design_name",
+        "product_type",
+        "file_type",
+        "design_color",
+        "endcode",
+        "file_id",
+        "file_name",
+        "file_md5",
+        "design_folder_id",
+        "searched_codes",
+        "is_adult",
+        "destination_folder",
+        "category_path",
+        "status",
+    )
 
-    def __init__(self, order_id, quantity, sku):
+    def __init__(self, order_id, quantity, sku, parsed_sku=None):
         self.order_id = order_id
         self.quantity = quantity
 
-        self.sku = sku  # full sku - KOSZ_MES_C_ZAJZAW_Geode_04C_XXL
-        self.first_code = get_code(
-            self.sku
-        )  # first code - to help join same order designs in different sizes
-        self.code = get_code(self.sku)  # code - ZAJZAW_GEODE_04C
-        self.design_name = get_design(self.code)  # design name - ZAJZAW
-        self.product_type = get_product_type(self.sku)  # product type
-        self.file_type = get_file_type(
-            self.product_type
-        )  # design file type ===> "pdf" or "png"
-        self.design_color = self.get_design_color()  # Colors are black or white.
-        self.endcode = get_design_endcode(self.code)
+        parsed_sku = parsed_sku or SKU_PARSER.parse(sku)
 
+        self.sku = sku  # full sku - KOSZ_MES_C_ZAJZAW_Geode_04C_XXL
+        self.first_code = parsed_sku.code  # first code - to help join same order designs in different sizes
+        self.code = parsed_sku.code  # code - ZAJZAW_GEODE_04C
+        self.design_name = parsed_sku.design_name  # design name - ZAJZAW
+        self.product_type = parsed_sku.product_type  # product type
+        self.file_type = parsed_sku.file_type  # design file type ===> "pdf" or "png"
+        self.design_color = parsed_sku.design_color  # Colors are black or white.
+        self.endcode = parsed_sku.endcode
+
+        # Design file is found later for all orders at once, see resolve_orders.
+        self.file_id, self.file_name, self.file_md5 = None, None, None
         self.design_folder_id = self.get_folder_id()
         self.searched_codes = []
-        self.file_id, self.file_name = find_file_id(
-            drive_service=self.drive_service,
-            keywords=self.get_keywords(),
-            root_folder_id=self.design_folder_id,
-        )
-        self.is_adult = is_adult(
-            self.sku
-        )  # Is a small or big format print (big => adults; samll => kids)
+        self.is_adult = parsed_sku.is_adult  # Is a small or big format print (big => adults; samll => kids)
+        if self.is_adult is None:
+            save_error_to_file(
+                f"Could not determine product type from: '{sku}' file.", order_id=order_id, sku=sku
+            )
+            self.destination_folder, self.category_path = None, None
+        else:
+            self.destination_folder = get_destination_folder(self.product_type, self.is_adult, self.design_color)
+            self.category_path = get_category_path(self.destination_folder, self.design_color)
 
         self.status = False
 
     def __str__(self):
         return f"{self.order_id} - {self.sku} - x{self.quantity}"
 
+    def set_file(self, file_data):
+        if file_data:
+            self.file_id, self.file_name = file_data["id"], file_data["name"]
+            self.file_md5 = file_data.get("md5Checksum")
+        else:
+            self.file_id, self.file_name, self.file_md5 = None, None, None
+
     def get_folder_id(self):
         if self.product_type in ["KOSZ", "POD", "LEZA"]:
             self.file_name = self.code + ".png"
@@ -180,163 +190,199 @@ class Order:
 
     # returns color of design
     def get_design_color(self):
-        WHITE_TYPE = [
-            "KOSZ_MES_B",
-            "KOSZ_DAM_B",
-            "KOSZ_DZIEC_CHLOP_B",
-            "KB_ZW",
-            "KB_MAG",
-            "POD_ZW",
-        ]
-        BLACK_TYPE = ["KOSZ_MES_C", "KOSZ_DAM_C", "KB_FUN_C"]
-
-        if "H999" in self.sku:
-            return "black_ht"
-        if "KB_GOLD_GD" in self.sku:
-            return "gold"
-
-        suffix = re.search(r"\d{2,4}[A-Z]", self.code)
-        if suffix:
-            text = suffix.group(0)
-            if "B" in text:
-                return "white"
-            elif "C" in text:
-                return "black"
-        else:
-            for prod_type in WHITE_TYPE:
-                if prod_type in self.sku:
-                    return "white"
-            for prod_type in BLACK_TYPE:
-                if prod_type in self.sku:
-                    return "black"
-        return None
-
-    # returns destination folder string
-    @property
-    def destination_folder(self):
-        # Create Different folder for KUBKI, KOSZ, and KOSZ_DZIEC for sizes: 3-4, 5-6, 7-8
-
-        for product in PRODUCTS:
-            if re.search(product, self.sku):
-                label = product
-                break
-            label = None
-
-        if label:
-            if label == "KOSZ":
-                for size in SMALL_SIZES:
-                    if re.search(size, self.sku):
-                        if self.design_color == "black_ht":
-                            return "HALFTONE_KOSZ_DZIECIECE"
-                        return "KOSZ_DZIECIECE"
-                if self.design_color == "black_ht":
-                    return "HALFTONE_KOSZ_DOROSLI"
-                return "KOSZ_DOROSLI"
-            elif label in ["KB_ZW", "KB_FUN", "KB_MAG", "KB_GOLD"]:
-                return "Kubki"
-            else:
-                return label
-        else:
-            save_error_to_file(f"Could not label where to save '{self.sku}' file.")
+        return get_design_color(self.sku, self.code)
 
 
-def is_adult(sku):
-    for product in PRODUCTS:
-        if re.search(product, sku):
-            label = product
-            break
-        label = None
+# csv column headers in Baselinker export
+ORDER_ID_HEADER = "Nr zamówienia"
+QUANTITY_HEADER = "Ilość sztuk nadruku"
+SKU_HEADER = "SKU"
 
-    if label:
-        if label == "KOSZ":
-            for size in SMALL_SIZES:
-                if re.search(size, sku):
-                    return False
-            return True
-        else:
-            return False
-    else:
-        save_error_to_file(
-            f"Could not determine product type from: '{sku}' file.",
-            folder_path,
-            datetime_string,
-        )
 
+def get_order_key(order_id, product_type, code, adult):
+    """
+    Rows with the same key are printed as one order with summed quantity.
+    """
+    return order_id, product_type, code, adult
 
-# get data from csv file
-def get_orders(csv_file_path):
-    with open(csv_file_path) as f:
+
+def read_order_rows(csv_file_path):
+    """
+    Read order rows from Baselinker csv export. Rows without order id, quantity or sku are skipped.
+
+    :return: generator of (order_id, quantity, sku) tuples
+    """
+    # Columns read here are ascii, a character misdecoded after the sniffed sample can't break the import.
+    with open(csv_file_path, encoding=detect_encoding(csv_file_path), errors="replace", newline="") as f:
         csv_reader = csv.reader(f, delimiter=";")
 
-        order_list = []
+        order_id_index = 0
+        quantity_index = 1
+        sku_index = 2
 
-        for row in csv_reader:
+        for row_number, row in enumerate(csv_reader):
             if len(row) > 0:
-                # if (
-                #     "Nr zamówienia" in row
-                #     and "Ilość sztuk nadruku" in row
-                #     and "SKU" in row
-                # ):
-                #     order_id_index = row.index("Nr zamówienia")
-                #     quantity_index = row.index("Ilość sztuk nadruku")
-                #     sku_index = row.index("SKU")
-                #     continue
-                # elsek'IloĹ›Ä‡ sztuk nadruku':
-                #     order_id_index = 0
-                #     quantity_index = 1
-                #     sku_index = 2
-
-                order_id_index = 0
-                quantity_index = 1
-                sku_index = 2
-
-                with suppress(ValueError):
-                    order_id = row[order_id_index]
-                    quantity = int(row[quantity_index])
-                    sku = row[sku_index]
-                    code = get_code(sku)
-                    product_type = get_product_type(sku)
-
-                    matching_order = next(
-                        (
-                            order
-                            for order in order_list
-                            if order.order_id == order_id
-                            and product_type == order.product_type
-                            and (order.code == code or order.first_code == code)
-                            and is_adult(sku) == order.is_adult
-                        ),
-                        None,
-                    )
+                # Full Baselinker export - columns are found by headers in the first row.
+                if (
+                    row_number == 0
+                    and ORDER_ID_HEADER in row
+                    and QUANTITY_HEADER in row
+                    and SKU_HEADER in row
+                ):
+                    order_id_index = row.index(ORDER_ID_HEADER)
+                    quantity_index = row.index(QUANTITY_HEADER)
+                    sku_index = row.index(SKU_HEADER)
+                    continue
+
+                with suppress(ValueError, IndexError):
+                    yield row[order_id_index], int(row[quantity_index]), row[sku_index]
+
+
+class OrderTable:
+    """
+    Columnar storage of merged orders - one list per field instead of an Order object per order. Orders with the
+    same SKU share one ParsedSku. Suited for processing many exports at once, e.g. a month of orders for
+    reconciliation. Order objects are only created on demand, see to_orders.
+    """
+
+    __slots__ = ("order_ids", "quantities", "sku_ids", "parsed_skus", "_sku_ids", "_rows_by_key")
+
+    def __init__(self):
+        self.order_ids = []
+        self.quantities = array("l")
+        self.sku_ids = array("l")  # position of order ParsedSku in parsed_skus
+        self.parsed_skus = []
+        self._sku_ids = {}  # sku -> position in parsed_skus
+        self._rows_by_key = {}  # order key -> row number
+
+    def __len__(self):
+        return len(self.order_ids)
+
+    def __iter__(self):
+        """
+        :return: generator of (order_id, quantity, ParsedSku) tuples
+        """
+        parsed_skus = self.parsed_skus
+        for order_id, quantity, sku_id in zip(self.order_ids, self.quantities, self.sku_ids):
+            yield order_id, quantity, parsed_skus[sku_id]
+
+    def add(self, order_id, quantity, sku):
+        """
+        Add csv row. Rows of the same order and design are merged into one with summed quantity.
+        """
+        sku_id = self._sku_ids.get(sku)
+        if sku_id is None:
+            sku_id = self._sku_ids[sku] = len(self.parsed_skus)
+            self.parsed_skus.append(SKU_PARSER.parse(sku))
+        parsed_sku = self.parsed_skus[sku_id]
+
+        key = get_order_key(order_id, parsed_sku.product_type, parsed_sku.code, parsed_sku.is_adult)
+        row = self._rows_by_key.get(key)
+
+        if row is not None:
+            self.quantities[row] += quantity
+        else:
+            self._rows_by_key[key] = len(self.order_ids)
+            self.order_ids.append(order_id)
+            self.quantities.append(quantity)
+            self.sku_ids.append(sku_id)
+
+    def add_csv_file(self, csv_file_path):
+        for order_id, quantity, sku in read_order_rows(csv_file_path):
+            self.add(order_id, quantity, sku)
+
+    def to_orders(self):
+        return [
+            Order(order_id=order_id, quantity=quantity, sku=parsed_sku.sku, parsed_sku=parsed_sku)
+            for order_id, quantity, parsed_sku in self
+        ]
 
-                    if matching_order is not None:
-                        matching_order.quantity += quantity
-                    else:
-                        order = Order(order_id=order_id, quantity=quantity, sku=sku)
-                        order_list.append(order)
 
-    return order_list
+def get_order_table(csv_file_paths):
+    order_table = OrderTable()
+    for csv_file_path in csv_file_paths:
+        order_table.add_csv_file(csv_file_path)
+    return order_table
 
 
-def find_exact_file_id(drive_service, order):
-    log = "\n"
+# get data from csv file
+def get_orders(csv_file_path):
+    return get_order_table([csv_file_path]).to_orders()
+
+
+def get_order_groups(csv_file_path):
+    """
+    Orders from csv export, grouped by order id. All rows are read and merged first, like in get_orders - rows of
+    one order may be anywhere in the file. Reading takes a moment, groups are then yielded one by one, so files of
+    first orders are downloaded while next ones are searched.
+
+    :return: generator of Order lists
+    """
+    orders_by_id = {}
+    for order in get_orders(csv_file_path):
+        orders_by_id.setdefault(order.order_id, []).append(order)
+
+    yield from orders_by_id.values()
+
+
+def resolve_orders(drive_service, order_list, catalog=None):
+    """
+    Find design file id and name for every order. Each distinct design is searched once - locally if its folder
+    is indexed in catalog, otherwise on Drive with batched requests. Orders of unknown product type are not searched.
+    """
+    # Orders of the same design share one search.
+    orders_by_search = {}
+    for order in order_list:
+        # Product type is unknown, there is no folder to download the file to.
+        if order.category_path is None:
+            order.set_file(None)
+            continue
+        search_key = (order.design_folder_id, tuple(order.get_keywords()))
+        orders_by_search.setdefault(search_key, []).append(order)
+
+    found_files = {}
+    searches = {}
+
+    for search_key in orders_by_search:
+        folder_id, keywords = search_key
+        if catalog and catalog.has_folder(folder_id):
+            found_files[search_key] = find_file_in_folder_by_keywords(
+                drive_service, list(keywords), folder_id, catalog=catalog
+            )
+        else:
+            searches[search_key] = (list(keywords), folder_id)
+
+    found_files.update(batch_find_files_by_keywords(drive_service, searches))
+
+    for search_key, orders in orders_by_search.items():
+        for order in orders:
+            order.set_file(found_files[search_key])
+            RUN_LOG.log(
+                "order",
+                order_id=order.order_id,
+                sku=order.sku,
+                keywords=list(search_key[1]),
+                folder_id=search_key[0],
+                result=order.file_name,
+            )
+
 
+def find_exact_file_id(drive_service, order):
     if order.design_folder_id and order.code and order.file_type:
         if order.design_color == "black_ht":
             design_code = order.code + "_H999" + order.file_type
         else:
             design_code = order.code + order.file_type
 
+        started = time.perf_counter()
         query = f"'{order.design_folder_id}' in parents and name = '{design_code}'"
         page_token = None
 
         print(f"\nSearch: {design_code}")
-        log += f"\nSearch: {design_code}"
         while True:
-            response = (
+            response = DRIVE_SCHEDULER.execute(
                 drive_service.files()
                 .list(q=query, fields="files(id, name)", pageToken=page_token)
-                .execute()
             )
             if "files" in response:
                 for file in response.get("files", []):
@@ -349,18 +395,14 @@ def find_exact_file_id(drive_service, order):
                 design_id_response = None
                 break
 
-        if design_id_response:
-            log += f"\nFound file: {file.get('name')}, {file.get('id')}\n"
-            save_search_log_to_file(log, folder_path, datetime_string)
-            design_id = design_id_response[0]["id"]
-            file_name = design_id_response[0]["name"]
-            return design_id, file_name
+        result = design_id_response[0] if design_id_response else None
+        log_search(query, design_id_response, result, started, order_id=order.order_id, sku=order.sku)
 
-        else:
-            print(f"Not found: {design_code}")
-            log += f"\nNot found: {design_code}"
-            save_search_log_to_file(log, folder_path, datetime_string)
-            return None, None
+        if result:
+            return result["id"], result["name"]
+
+        print(f"Not found: {design_code}")
+        return None, None
 
     else:
         print(f"Not found: {order.code}{order.file_type}")
@@ -398,83 +440,208 @@ def get_no_endcode(order):
     return None
 
 
-def find_file_and_download(drive_service, order, folder_path, download_files=True):
-    file_counter = None
+def get_order_file_name(order):
     if CONTRACTOR == "FAKTORIA":
-        file_counter = order.quantity
-        base = " - ".join(
-            [
-                order.destination_folder,
-                order.order_id,
-                order.file_name,
-            ]
-        )
-        # .png/.pdf is added -> need to be removed
-        base_file_name = base.replace(order.file_type, "")
+        # Each printed piece is a separate file: "... (3).png", "... (2).png", "... (1).png"
+        return get_faktoria_base_file_name(order) + f" ({order.quantity}){order.file_type}"
+    return " - ".join(
+        [
+            order.destination_folder,
+            order.order_id,
+            f"x{order.quantity}",
+            order.file_name,
+        ]
+    )
 
-    else:
-        file_name = " - ".join(
-            [
-                order.destination_folder,
-                order.order_id,
-                f"x{order.quantity}",
-                order.file_name,
-            ]
-        )
 
-    if order.destination_folder == "Kubki":
-        if CONTRACTOR == "FAKTORIA":
-            category_folder = os.path.join(folder_path, "Kubki")
-        else:
-            category_folder = os.path.join(folder_path, "Kubki", order.design_color)
-    elif order.destination_folder == "LEZA":
-        category_folder = os.path.join(folder_path, "black", "Lezaki")
-    else:
-        category_folder = os.path.join(
-            folder_path, order.design_color or "", order.destination_folder
-        )
+def get_faktoria_base_file_name(order):
+    base = " - ".join(
+        [
+            order.destination_folder,
+            order.order_id,
+            order.file_name,
+        ]
+    )
+    # .png/.pdf is added -> need to be removed
+    return base.replace(order.file_type, "")
+
+
+def prepare_order_download(order, folder_path):
+    """
+    Create order category folder.
+
+    :return: tuple (category_folder, file_name) - where and under which name order file is downloaded
+    """
+    category_folder = os.path.join(folder_path, order.category_path)
+
+    # Folders may be created by several download workers at the same time.
+    os.makedirs(category_folder, exist_ok=True)
+
+    return category_folder, get_order_file_name(order)
+
+
+# Manifest files are appended by several download workers.
+MANIFEST_LOCK = threading.Lock()
+MANIFEST_FILE_NAME = "manifest.csv"
+
+
+def add_to_manifest(category_folder, file_name, quantity):
+    """
+    Add file and number of pieces to print to manifest CSV of category folder.
+    """
+    manifest_path = os.path.join(category_folder, MANIFEST_FILE_NAME)
 
-    if not os.path.exists(folder_path):
-        os.makedirs(folder_path)
+    with MANIFEST_LOCK:
+        new_file = not os.path.exists(manifest_path)
+        with open(manifest_path, "a", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, delimiter=";")
+            if new_file:
+                writer.writerow(["file", "quantity"])
+            writer.writerow([file_name, quantity])
 
-    if not os.path.exists(category_folder):
-        os.makedirs(category_folder)
+
+def copy_order_file(order, category_folder, file_name, copy_mode=FAKTORIA_COPY_MODE):
+    """
+    FAKTORIA gets a copy of downloaded file for every printed piece, or a single file with its quantity in
+    manifest CSV if copy_mode is "manifest".
+
+    Called only for downloaded files, copies or manifest rows of a missing file would look like valid output.
+
+    :param copy_mode: "manifest" or copy mode of utils.copy_file
+    """
+    if CONTRACTOR == "FAKTORIA":
+        src = os.path.join(category_folder, file_name)
+        if not os.path.isfile(src):
+            save_error_to_file("File to copy was not downloaded.", order_id=order.order_id, file_name=file_name)
+            return
+
+        if copy_mode == "manifest":
+            add_to_manifest(category_folder, file_name, order.quantity)
+            return
+
+        base_file_name = get_faktoria_base_file_name(order)
+        with RUN_STATS.measure("copy") as stage:
+            for file_counter in range(order.quantity - 1, 0, -1):
+                dst = os.path.join(category_folder, base_file_name + f" ({file_counter}){order.file_type}")
+                copy_file(src, dst, copy_mode)
+            if copy_mode == "copy":
+                stage["bytes"] = os.path.getsize(src) * (order.quantity - 1)
+
+
+def find_file_and_download(drive_service, order, folder_path, download_files=True, http=None, cache=None):
+    """
+    :return: True if order file was downloaded
+    """
+    category_folder, file_name = prepare_order_download(order, folder_path)
 
     if download_files:
-        if CONTRACTOR == "FAKTORIA":
-            file_name = base_file_name + f" ({file_counter}){order.file_type}"
-            file_counter -= 1
+        saved = download_file_by_id(
+            drive_service,
+            order.file_id,
+            file_name,
+            category_folder,
+            is_adult=order.is_adult,
+            http=http,
+            md5_checksum=order.file_md5,
+            cache=cache,
+        )
+        if saved:
+            copy_order_file(order, category_folder, file_name)
+        return saved
+
+    return False
 
-        download_file_by_id(
+
+def download_orders(drive_service, credentials, order_list, folder_path, workers=DOWNLOAD_WORKERS, cache=None):
+    """
+    Download files of given orders with a pool of worker threads. Each worker sends requests through its own
+    authorized http client. order_list may be a generator, each order is downloaded as soon as it is yielded.
+
+    :return: list of (order, exception) tuples for orders which download failed
+    """
+    failed_orders = []
+
+    def download(order):
+        saved = find_file_and_download(
             drive_service,
+            order,
+            folder_path,
+            download_files=True,
+            http=get_thread_http(credentials),
+            cache=cache,
+        )
+        if not saved:
+            raise IOError("File was not saved.")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(download, order): order for order in order_list}
+        for future in as_completed(futures):
+            error = future.exception()
+            if error:
+                failed_orders.append((futures[future], error))
+
+    return failed_orders
+
+
+async def download_orders_async(credentials, order_list, folder_path, cache=None):
+    """
+    Download files of given orders with AsyncDriveClient on one event loop instead of worker threads.
+    order_list may be a generator, each order is downloaded as soon as it is yielded. Generator runs in a worker
+    thread, its blocking Drive searches don't stop downloads on the event loop.
+
+    :return: list of (order, exception) tuples for orders which download failed
+    """
+    loop = asyncio.get_running_loop()
+
+    async def download(order):
+        category_folder, file_name = prepare_order_download(order, folder_path)
+        saved = await client.download_file(
             order.file_id,
             file_name,
             category_folder,
             is_adult=order.is_adult,
+            md5_checksum=order.file_md5,
+            cache=cache,
         )
-        if CONTRACTOR == "FAKTORIA":
-            import shutil
+        if not saved:
+            raise IOError("File was not saved.")
+        await loop.run_in_executor(None, copy_order_file, order, category_folder, file_name)
 
-            origin_file_name = file_name
-            for i in range(file_counter, 0, -1):
-                file_name = base_file_name + f" ({file_counter}){order.file_type}"
-                src = os.path.join(category_folder, origin_file_name)
-                dst = os.path.join(category_folder, file_name)
-                shutil.copyfile(src, dst)
-                file_counter -= 1
+    async with AsyncDriveClient(credentials) as client:
+        tasks = {}
+        orders = iter(order_list)
+        while True:
+            order = await loop.run_in_executor(None, next, orders, None)
+            if order is None:
+                break
+            tasks[asyncio.ensure_future(download(order))] = order
+
+        if tasks:
+            await asyncio.wait(tasks)
+
+    return [(order, task.exception()) for task, order in tasks.items() if task.exception()]
 
 
-def main(csv_file_path, download_files=True):
+@profiled
+def main(csv_file_path, download_files=True, workers=DOWNLOAD_WORKERS, use_async=ASYNC_DRIVE):
+    # Every record of this run, catalog sync included, goes to its own log file.
+    RUN_LOG.start_run()
+    RUN_STATS.start_run()
+    DRIVE_SCHEDULER.reset_counters()
+
     # Get credentials file path
     if getattr(sys, "frozen", False):
         client_secret_file = resource_path("credentials.json")
     else:
         client_secret_file = "credentials.json"
 
-    drive_service = create_service(
+    # Service and download workers share one credentials object, token is loaded and refreshed once.
+    credentials = load_credentials(
         client_secret_file, "drive", "v3", ["https://www.googleapis.com/auth/drive"]
     )
-    Order.drive_service = drive_service
+    drive_service = create_service(
+        client_secret_file, "drive", "v3", ["https://www.googleapis.com/auth/drive"], credentials=credentials
+    )
 
     if not (
         WHITE_SHIRT_FOLDER_ID
@@ -486,45 +653,108 @@ def main(csv_file_path, download_files=True):
         print(f"Could not get drive folders ID's")
         return False
 
-    global datetime_string
-    datetime_string = datetime.now().strftime("%d-%m-%Y - %H%M%S")
-
-    global folder_path
-    folder_path = os.path.join(os.getcwd(), f"Baselinker - {datetime_string}")
-
-    if csv_file_path and drive_service:
-        # TODO add counter for found files and downloaded files
-        order_list = get_orders(csv_file_path)
-        order_count = len(order_list)
-        order_file_exists_count = 0
-        order_download_count = 0
-
-        for order in order_list:
-            if order.file_id:
-                find_file_and_download(
-                    drive_service, order, folder_path, download_files=download_files
-                )
+    # SQLite connection of the catalog is closed when the run ends, a new one is opened by the next run.
+    with CatalogStore(get_catalog_store_path("drive", "v3")) as catalog_store:
+        # List every design folder once, so orders are matched against local index instead of one query per order.
+        # Listings are persisted between runs and refreshed from Drive changes.
+        catalog = DriveCatalog(drive_service, catalog_store)
+        with RUN_STATS.measure("catalog_load"):
+            catalog.load_folders(
+                [
+                    WHITE_SHIRT_FOLDER_ID,
+                    WHITE_CUP_FOLDER_ID,
+                    BLACK_SHIRT_FOLDER_ID,
+                    BLACK_CUP_FOLDER_ID,
+                    BLACK_HALFTONE_SHIRT_FOLDER_ID,
+                    GOLD_CUP_FOLDER_ID,
+                ]
+            )
 
-                order_file_exists_count += 1
-                if download_files:
-                    order_download_count += 1
+        cache = None
+        if DESIGN_CACHE_MAX_MB > 0:
+            cache = DesignCache(DESIGN_CACHE_FOLDER, DESIGN_CACHE_MAX_MB * 1024 * 1024)
+
+        global datetime_string
+        datetime_string = datetime.now().strftime("%d-%m-%Y - %H%M%S")
+
+        global folder_path
+        folder_path = os.path.join(os.getcwd(), f"Baselinker - {datetime_string}")
+
+        if csv_file_path and drive_service:
+            # TODO add counter for found files and downloaded files
+            order_count = 0
+            order_file_exists_count = 0
+            order_download_count = 0
+
+            # Orders are resolved and handed to download group by group, downloads start before all designs are found.
+            def get_found_orders():
+                nonlocal order_count, order_file_exists_count
+
+                for order_group in RUN_STATS.measure_iter("csv_parse", get_order_groups(csv_file_path)):
+                    with RUN_STATS.measure("drive_search"):
+                        resolve_orders(drive_service, order_group, catalog=catalog)
+                    order_count += len(order_group)
+
+                    for order in order_group:
+                        if order.file_id:
+                            order_file_exists_count += 1
+                            yield order
+                        else:
+                            save_error_to_file("Order file id not found", order_id=order.order_id, sku=order.sku)
+
+            if download_files and (use_async or workers > 1):
+                if use_async:
+                    failed_orders = asyncio.run(
+                        download_orders_async(credentials, get_found_orders(), folder_path, cache=cache)
+                    )
+                else:
+                    failed_orders = download_orders(
+                        drive_service, credentials, get_found_orders(), folder_path, workers=workers, cache=cache
+                    )
+                for order, error in failed_orders:
+                    save_error_to_file(
+                        f"Download failed: {error}", order_id=order.order_id, sku=order.sku, file_id=order.file_id
+                    )
+                order_download_count = order_file_exists_count - len(failed_orders)
             else:
-                save_error_to_file(
-                    f"\nOrder file id not found: {order.order_id} - {order.sku}\n",
-                    folder_path,
-                    datetime_string,
-                )
-
-        print(f"Downloaded {order_download_count} files.")
-
-        if order_count != order_download_count:
-            save_error_to_file(
-                f"\nOrders: {order_count}\nFound files: {order_download_count}\nMissing files: {order_count-order_download_count}",
-                folder_path,
-                datetime_string,
+                for order in get_found_orders():
+                    saved = find_file_and_download(
+                        drive_service, order, folder_path, download_files=download_files, cache=cache
+                    )
+                    if saved:
+                        order_download_count += 1
+                    elif download_files:
+                        save_error_to_file(
+                            "Download failed: File was not saved.",
+                            order_id=order.order_id,
+                            sku=order.sku,
+                            file_id=order.file_id,
+                        )
+
+            print(f"Downloaded {order_download_count} files.")
+            print(f"Drive requests: {DRIVE_SCHEDULER.get_counters()}")
+
+            RUN_LOG.log(
+                "summary",
+                orders=order_count,
+                found_files=order_file_exists_count,
+                downloaded_files=order_download_count,
+                missing_files=order_count - order_download_count,
+                drive_requests=DRIVE_SCHEDULER.get_counters(),
+            )
+            RUN_LOG.flush()
+
+            # Saved next to "Baselinker - <date>" output folder.
+            RUN_STATS.save_report(
+                f"{folder_path} - report.json",
+                orders=order_count,
+                found_files=order_file_exists_count,
+                downloaded_files=order_download_count,
+                drive_requests=DRIVE_SCHEDULER.get_counters(),
+                drive_endpoints=DRIVE_SCHEDULER.get_endpoints(),
             )
 
-        return order_count, order_download_count, order_file_exists_count
+            return order_count, order_download_count, order_file_exists_count
 
-    else:
-        return False
+        else:
+            return False
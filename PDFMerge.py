@@ -1,26 +1,76 @@
 import os
 from datetime import datetime
 
-from pypdf import PdfWriter
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import IndirectObject, StreamObject
 
+from profiling import profiled
+from utils import get_file_hash
 
-def merge_pdf(path_to_file_folder, destination_path):
+
+def compress_content_streams(writer):
+   """
+   Flate compress page content streams which are not compressed yet. Content shared by copies of the same page
+   is compressed once.
+   """
+   compressed = set()
+
+   for page in writer.pages:
+      contents = page.raw_get("/Contents") if "/Contents" in page else None
+      # Content split into array of streams is left as it is - replacing it would break the copies sharing it.
+      if not isinstance(contents, IndirectObject) or contents.idnum in compressed:
+         continue
+
+      stream = contents.get_object()
+      if isinstance(stream, StreamObject) and "/Filter" not in stream:
+         # Stream object is replaced in place, so copies sharing it get the compressed one too.
+         page.compress_content_streams()
+      compressed.add(contents.idnum)
+
+
+@profiled
+def merge_pdf(path_to_file_folder, destination_path, compress=True):
+   """
+   Merge all PDF files from folder and its subfolders into one file. Identical files (e.g. FAKTORIA "(n)" copies of
+   the same cup) are read once and their pages share content streams, images and fonts of the first copy, so
+   the merged file grows only by a small page object per copy.
+
+   :param compress: compress uncompressed content streams
+   :return: (True, number of merged files)
+   """
    count = 0
    dt_string = datetime.now().strftime("%d-%m-%Y - %H%M%S")
 
    #Create instance of PdfWriter() class
    merger = PdfWriter()
+   readers = {}  # file hash -> PdfReader
 
    #Get the file names in the directory
    for root, dirs, file_names in os.walk(path_to_file_folder):
       for file_name in file_names:
          #Append PDF files
          if ".pdf" in file_name:
-            merger.append(os.path.join(path_to_file_folder, file_name))
+            file_path = os.path.join(root, file_name)
+            file_hash = get_file_hash(file_path)
+
+            if file_hash in readers:
+               # Page dictionary is copied, objects it refers to are already in the writer and are reused.
+               for page in readers[file_hash].pages:
+                  merger.add_page(page)
+            else:
+               readers[file_hash] = PdfReader(file_path)
+               merger.append(readers[file_hash])
             count += 1
 
-   #Write out merged PDF file
-   merger.write(os.path.join(destination_path, f"PDF-WinLuk-{dt_string}.pdf"))
+   if compress:
+      compress_content_streams(merger)
+
+   print(f"Połączono {count} plików PDF, w tym {count - len(readers)} powtórzonych.")
+
+   #Write out merged PDF file, renamed when complete
+   output_path = os.path.join(destination_path, f"PDF-WinLuk-{dt_string}.pdf")
+   merger.write(f"{output_path}.part")
    merger.close()
+   os.replace(f"{output_path}.part", output_path)
 
-   return True, count
\ No newline at end of file
+   return True, count
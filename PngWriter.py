@@ -0,0 +1,133 @@
+import os
+import struct
+import zlib
+
+from PIL import Image, ImageChops
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Every row is stored as difference from the row above, transparent margins and flat areas compress to almost nothing.
+FILTER_UP = b"\2"
+
+
+class PngStreamWriter:
+    """
+    Write RGBA PNG file band by band, so the whole image never has to be in memory. Rows are filtered (Up) and
+    compressed into IDAT chunks as they come, image size must be known up front. File is written next to path with
+    .part suffix and renamed when finished, an interrupted write leaves no PNG behind.
+
+    Use as context manager:
+        with PngStreamWriter(path, width, height, dpi=(200, 200)) as writer:
+            writer.write_image(band)
+            writer.write_empty_rows(10)
+    """
+
+    def __init__(self, path: str, width: int, height: int, dpi=None, level: int = 6, chunk_size: int = 1024 * 1024):
+        """
+        :param dpi: (x, y) dpi saved in pHYs chunk, same as dpi argument of Image.save
+        :param level: zlib compression level
+        :param chunk_size: max size of IDAT chunk in bytes
+        """
+        self.path = path
+        self.width = width
+        self.height = height
+        self.dpi = dpi
+        self.chunk_size = chunk_size
+        self.rows_written = 0
+
+        self._file = None
+        self._temp_path = f"{path}.part"
+        self._compressor = zlib.compressobj(level)
+        self._buffer = bytearray()
+        self._previous_row = None  # last written row as 1 pixel high image, None if it is transparent
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._temp_path)
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes) -> None:
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    def _add_compressed(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) >= self.chunk_size:
+            self._write_chunk(b"IDAT", bytes(self._buffer[:self.chunk_size]))
+            del self._buffer[:self.chunk_size]
+
+    def open(self) -> None:
+        self._file = open(self._temp_path, "wb")
+        self._file.write(PNG_SIGNATURE)
+        # 8 bits per channel, RGBA, no interlace
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 6, 0, 0, 0))
+        if self.dpi:
+            # pixels per meter, rounded the same way as Pillow does
+            self._write_chunk(
+                b"pHYs", struct.pack(">IIB", int(self.dpi[0] / 0.0254 + 0.5), int(self.dpi[1] / 0.0254 + 0.5), 1)
+            )
+
+    def _write_rows(self, filtered, rows: int) -> None:
+        if self.rows_written + rows > self.height:
+            raise ValueError(f"PNG has {self.height} rows, can't write {self.rows_written + rows}.")
+
+        stride = self.width * 4
+        filtered = memoryview(filtered)
+        for row in range(rows):
+            self._add_compressed(self._compressor.compress(FILTER_UP))
+            self._add_compressed(self._compressor.compress(filtered[row * stride:(row + 1) * stride]))
+        self.rows_written += rows
+
+    def write_image(self, image) -> None:
+        """
+        Write next rows from RGBA Pillow image of PNG width.
+        """
+        if image.mode != "RGBA" or image.width != self.width:
+            raise ValueError(f"Expected RGBA image {self.width} pixels wide, got {image.mode} {image.width}.")
+        if not image.height:
+            return
+
+        # Up filter - image minus the same image shifted one row down, starting with the last written row.
+        above = Image.new("RGBA", image.size, (0, 0, 0, 0))
+        if self._previous_row is not None:
+            above.paste(self._previous_row, (0, 0))
+        if image.height > 1:
+            above.paste(image.crop((0, 0, image.width, image.height - 1)), (0, 1))
+        self._write_rows(ImageChops.subtract_modulo(image, above).tobytes(), image.height)
+        self._previous_row = image.crop((0, image.height - 1, image.width, image.height))
+
+    def write_empty_rows(self, rows: int) -> None:
+        """
+        Write next rows of transparent pixels.
+        """
+        if rows <= 0:
+            return
+        if self._previous_row is not None:
+            self.write_image(Image.new("RGBA", (self.width, 1), (0, 0, 0, 0)))
+            rows -= 1
+        # Transparent row below transparent row is all zeros after filtering.
+        empty_row = bytes(self.width * 4)
+        for _ in range(rows):
+            self._write_rows(empty_row, 1)
+        self._previous_row = None
+
+    def close(self) -> None:
+        """
+        Fill missing rows with transparent pixels, finish the file and move it to its path.
+        """
+        self.write_empty_rows(self.height - self.rows_written)
+        self._add_compressed(self._compressor.flush())
+        if self._buffer:
+            self._write_chunk(b"IDAT", bytes(self._buffer))
+            self._buffer.clear()
+        self._write_chunk(b"IEND", b"")
+        self._file.close()
+        os.replace(self._temp_path, self.path)
@@ -0,0 +1,93 @@
+import atexit
+import json
+import os
+import threading
+from datetime import datetime
+
+
+class RunLogger:
+    """
+    Log of one run as JSON Lines file, logs/run - <start time>.jsonl. Records are kept in memory and written by
+    a background thread every flush_interval seconds through one open file, so logging from download workers
+    costs no file operations. The file is created with the first record.
+
+    Record: {"time": "...", "type": "search", ...fields}
+    """
+
+    def __init__(self, folder: str = None, flush_interval: float = 1.0):
+        """
+        :param folder: folder of log files, logs in current working directory if None
+        :param flush_interval: seconds between writes of buffered records
+        """
+        self.folder = folder or os.path.join(os.getcwd(), "logs")
+        self.flush_interval = flush_interval
+        self.path = None
+
+        self._records = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # keeps records in order when flushed from several threads
+        self._file = None
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.start_run()
+
+    def start_run(self) -> None:
+        """
+        Start new log file, records logged so far are written to the previous one.
+        """
+        self.flush()
+        with self._flush_lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+            self.path = os.path.join(self.folder, f"run - {datetime.now().strftime('%d-%m-%Y - %H%M%S')}.jsonl")
+
+    def log(self, record_type: str, **fields) -> None:
+        record = {"time": datetime.now().isoformat(timespec="milliseconds"), "type": record_type}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+
+        with self._lock:
+            self._records.append(line)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_periodically, name="RunLogger", daemon=True)
+                self._thread.start()
+
+    def error(self, message: str, **fields) -> None:
+        self.log("error", message=message, **fields)
+
+    def _flush_periodically(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write buffered records to the log file.
+        """
+        with self._flush_lock:
+            with self._lock:
+                records, self._records = self._records, []
+            if not records:
+                return
+
+            if self._file is None:
+                os.makedirs(self.folder, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("\n".join(records) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.flush()
+        with self._flush_lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+# Shared by the whole program, records left in buffer are written at exit.
+RUN_LOG = RunLogger()
+atexit.register(RUN_LOG.close)
@@ -0,0 +1,148 @@
+from typing import NamedTuple
+
+
+class Design(NamedTuple):
+    """
+    Design scaled for print, sizes in pixels.
+    """
+    path: str
+    width: int
+    height: int
+    rotate: bool = False  # rotated by 90 degrees before it is placed
+    original_size: tuple = None  # size of the image file, before rotation and scaling
+
+
+class Placement(NamedTuple):
+    design: Design
+    x: int
+    y: int
+
+
+class Shelf:
+    """
+    Row of designs on a sheet. Its height is the height of the first (highest) design placed in it, or of the highest
+    design of the row for pack_row.
+    """
+
+    __slots__ = ("y", "height", "x")
+
+    def __init__(self, y: int, height: int):
+        self.y = y
+        self.height = height
+        self.x = 0  # where the next design starts
+
+
+class Sheet:
+    """
+    Print sheet filled with shelves of designs, left to right and top to bottom. Sheet is cut after the last design,
+    so its width is the used width, height is always max_height unless an oversized design is placed on it.
+    Sheet without max_height is a roll - shelves are added below as long as there are designs.
+    """
+
+    def __init__(self, max_width: int, max_height: int = None, spacing: int = 0):
+        """
+        :param max_width: max sheet width in pixels
+        :param max_height: sheet height in pixels, None for roll of any length
+        :param spacing: space between designs and between shelves in pixels
+        """
+        self.max_width = max_width
+        self.max_height = max_height
+        self.spacing = spacing
+        self.shelves = []
+        self.placements = []
+
+    @property
+    def width(self) -> int:
+        return max((placement.x + placement.design.width for placement in self.placements), default=0)
+
+    @property
+    def height(self) -> int:
+        used_height = max((placement.y + placement.design.height for placement in self.placements), default=0)
+        return max(self.max_height or 0, used_height)
+
+    @property
+    def designs_area(self) -> int:
+        return sum(placement.design.width * placement.design.height for placement in self.placements)
+
+    @property
+    def utilization(self) -> float:
+        """
+        Part of sheet area covered by designs, 0 - 1.
+        """
+        area = self.width * self.height
+        return self.designs_area / area if area else 0.0
+
+    def get_shelf_placements(self, shelf: Shelf) -> list:
+        return [placement for placement in self.placements if placement.y == shelf.y]
+
+    def _place(self, design: Design, shelf: Shelf) -> None:
+        self.placements.append(Placement(design, shelf.x, shelf.y))
+        shelf.x += design.width + self.spacing
+
+    def add(self, design: Design, force: bool = False) -> bool:
+        """
+        Place design on the first shelf it fits in or on a new shelf below.
+
+        :param force: place design on empty sheet even if it is bigger than the sheet
+        :return: True if design was placed
+        """
+        for shelf in self.shelves:
+            if design.height <= shelf.height and shelf.x + design.width <= self.max_width:
+                self._place(design, shelf)
+                return True
+
+        y = self.shelves[-1].y + self.shelves[-1].height + self.spacing if self.shelves else 0
+        fits = design.width <= self.max_width and (self.max_height is None or y + design.height <= self.max_height)
+        if fits or (force and not self.placements):
+            shelf = Shelf(y, design.height)
+            self.shelves.append(shelf)
+            self._place(design, shelf)
+            return True
+
+        return False
+
+
+def pack_sheets(designs: list, max_width: int, max_height: int = None, spacing: int = 0) -> list:
+    """
+    Pack designs into as few sheets as possible (shelf algorithm, first fit decreasing height). Designs are placed
+    from the highest one, each in the first sheet and shelf with room for it. Design bigger than the sheet gets
+    a sheet of its own. Without max_height all designs narrower than max_width go on one roll sheet.
+
+    :return: list of Sheet
+    """
+    sheets = []
+
+    for design in sorted(designs, key=lambda design: (design.height, design.width), reverse=True):
+        if not any(sheet.add(design) for sheet in sheets):
+            sheet = Sheet(max_width, max_height, spacing)
+            sheet.add(design, force=True)
+            sheets.append(sheet)
+
+    return sheets
+
+
+def pack_row(designs: list, spacing: int = 0, height: int = None) -> Sheet:
+    """
+    Place all designs in one row, in given order. Row is as high as the highest design.
+
+    :param height: sheet height, height of the highest design if None
+    """
+    row_height = max((design.height for design in designs), default=0)
+    sheet = Sheet(
+        sum(design.width for design in designs) + max(len(designs) - 1, 0) * spacing,
+        height or row_height,
+        spacing,
+    )
+    sheet.shelves.append(Shelf(0, row_height))
+    for design in designs:
+        if not sheet.add(design):
+            raise ValueError(f"Design {design.path} could not be placed in the row.")
+    return sheet
+
+
+def get_utilization(sheets: list) -> float:
+    """
+    Part of area of all sheets covered by designs, 0 - 1.
+    """
+    area = sum(sheet.width * sheet.height for sheet in sheets)
+    return sum(sheet.designs_area for sheet in sheets) / area if area else 0.0
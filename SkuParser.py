@@ -0,0 +1,326 @@
+import re
+import sys
+from functools import lru_cache
+from typing import NamedTuple
+
+from constants import SMALL_SIZES, PRODUCTS
+
+
+# Product prefixes in SKU, in order of matching - the first one the SKU starts with wins.
+PRODUCT_PREFIXES = [
+    "KOSZ_MES_B", "KOSZ_MES_C", "KOSZ_DAM_B", "KOSZ_DAM_C", "KOSZ_DZIEC_CHLOP_B", "KOSZ_DZIEC_CHLOP_C",
+    "KOSZ_DZIEC_DZIEW_B", "KOSZ_DZIEC_DZIEW_C", "KOSZ_DZIEC_B", "KOSZ_DZIEC_C", "KB_ZW", "1KB_ZW", "2KB_ZW",
+    "1_KB_ZW", "2_KB_ZW", "V1_KB_ZW", "V2_KB_ZW", "KB_MAG", "1KB_MAG", "2KB_MAG", "V1_KB_MAG", "V2_KB_MAG",
+    "V1_KB_FUN_C", "V2_KB_FUN_C", "KB_FUN_C", "KB_GOLD_GD", "1POD_ZW", "2POD_ZW", "POD_ZW", "V1_POD_ZW",
+    "V2_POD_ZW", "V1_LEZA", "V2_LEZA", "LEZA",
+]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL", "3-4", "5-6", "7-8", "9-11", "12-14"]
+
+CODE_FILTER = re.compile("(" + "|".join(PRODUCT_PREFIXES + [f"_{size}_" for size in SIZES]) + ")")
+CODE_SIZE_SUFFIX = re.compile(r"_XS$|_S$|_M$|_L$|_XL$|_XXL$|_3-4|_5-6|_7-8|_9-11|_12-14$")
+CODE_COLOR_PREFIX = re.compile(r"^_B_|^_C_")
+CODE_EDGE_UNDERSCORE = re.compile(r"^_|_$")
+CODE_HALFTONE = re.compile(r"_H999")
+
+DESIGN_ENDCODE = re.compile(r"_[0-9]{2,4}[BC]")
+DESIGN_LOOSE_ENDCODE = re.compile(r"\b\d{2}[BC]\b|\d{2}[BC]\b|\b\d{2}[BC]")
+ENDCODE = re.compile(r"\d{2,4}[A-Z]")
+
+WHITE_TYPE = [
+    "KOSZ_MES_B",
+    "KOSZ_DAM_B",
+    "KOSZ_DZIEC_CHLOP_B",
+    "KB_ZW",
+    "KB_MAG",
+    "POD_ZW",
+]
+BLACK_TYPE = ["KOSZ_MES_C", "KOSZ_DAM_C", "KB_FUN_C"]
+
+
+# transform sku to code.
+def get_code(sku):
+    code = CODE_FILTER.sub("", sku)
+    code = CODE_SIZE_SUFFIX.sub("", code)
+    code = CODE_COLOR_PREFIX.sub("", code)
+    code = CODE_EDGE_UNDERSCORE.sub("", code)
+    code = CODE_HALFTONE.sub("", code)
+    return code
+
+
+# transform code to design
+def get_design(code):
+    design = DESIGN_ENDCODE.sub("", code)
+    design = DESIGN_LOOSE_ENDCODE.sub("", design)
+
+    return design
+
+
+# returns design endcode:    PSY_LZ_TOARG_04C ===> 04C
+def get_design_endcode(code):
+    suffix = ENDCODE.search(code)
+
+    if suffix:
+        text = suffix.group(0)
+        return text
+    else:
+        return None
+
+
+# shorten design by one part:  PSY_LZ_TOARG ===> PSY_LZ
+def shorten_design(design):
+    parts = design.split("_")
+    if len(parts) <= 1:
+        return None
+
+    short_design = "_".join(parts[:-1])
+    return short_design
+
+
+# get product type:  KB_MAG_PSY_LZ_TOARG_04C ===> KB_MAG
+def get_product_type(sku):
+    for product in PRODUCTS:
+        if product in sku:
+            return product
+    return None
+
+
+# get file type to download: "pdf" or "png"
+def get_file_type(product_type):
+    if product_type in ["LEZA", "KOSZ", "POD"]:
+        file_type = ".png"
+        return file_type
+    elif product_type in ["KB_ZW", "KB_MAG", "KB_FUN", "KB_GOLD"]:
+        file_type = ".pdf"
+        return file_type
+    else:
+        return None
+
+
+# returns color of design
+def get_design_color(sku, code):
+    if "H999" in sku:
+        return "black_ht"
+    if "KB_GOLD_GD" in sku:
+        return "gold"
+
+    suffix = ENDCODE.search(code)
+    if suffix:
+        text = suffix.group(0)
+        if "B" in text:
+            return "white"
+        elif "C" in text:
+            return "black"
+    else:
+        for prod_type in WHITE_TYPE:
+            if prod_type in sku:
+                return "white"
+        for prod_type in BLACK_TYPE:
+            if prod_type in sku:
+                return "black"
+    return None
+
+
+# Is a small or big format print (big => adults; small => kids). None if product type is unknown.
+def is_adult(sku):
+    label = get_product_type(sku)
+
+    if label:
+        if label == "KOSZ":
+            for size in SMALL_SIZES:
+                if size in sku:
+                    return False
+            return True
+        else:
+            return False
+    return None
+
+
+class ParsedSku(NamedTuple):
+    sku: str  # full sku - KOSZ_MES_C_ZAJZAW_Geode_04C_XXL
+    code: str  # code - ZAJZAW_GEODE_04C
+    design_name: str  # design name - ZAJZAW
+    product_type: str  # product type - KOSZ
+    file_type: str  # design file type ===> ".pdf" or ".png"
+    design_color: str  # "white", "black", "black_ht" or "gold"
+    endcode: str  # 04C
+    is_adult: bool
+
+
+PRODUCT_PREFIX = re.compile("|".join(PRODUCT_PREFIXES))
+# product type and default design color of each prefix
+PREFIX_INFO = {prefix: (get_product_type(prefix), get_design_color(prefix, "")) for prefix in PRODUCT_PREFIXES}
+
+FILE_TYPES = {product_type: get_file_type(product_type) for product_type, _ in PREFIX_INFO.values()}
+
+PLAIN_TOKEN = re.compile(r"[^\W_]+")
+TOKEN_DESIGN_ENDCODE = re.compile(r"[0-9]{2,4}[BC]")
+LOOSE_ENDCODE = re.compile(r"\d{2}[BC]")
+# Parts which make regex filters match inside a token, such tokens are left to get_code and friends.
+AMBIGUOUS_PARTS = ("KOSZ", "LEZA", "POD", "KB", "H999")
+
+SIZE_TOKEN = "size"
+HALFTONE_TOKEN = "halftone"
+ENDCODE_TOKEN = "endcode"
+WORD_TOKEN = "word"
+
+
+@lru_cache(maxsize=16384)
+def classify_token(token):
+    """
+    Classify single SKU part.
+
+    :return: tuple (kind, endcode) or None if token can't be classified unambiguously
+    """
+    if token in SIZES:
+        return SIZE_TOKEN, None
+    if token == "H999":
+        return HALFTONE_TOKEN, None
+    if not PLAIN_TOKEN.fullmatch(token) or any(part in token for part in AMBIGUOUS_PARTS):
+        return None
+
+    endcode = ENDCODE.search(token)
+    endcode = endcode.group(0) if endcode else None
+
+    design_endcode = TOKEN_DESIGN_ENDCODE.match(token)
+    if design_endcode:
+        if design_endcode.end() != len(token):
+            return None
+        return ENDCODE_TOKEN, endcode
+    return WORD_TOKEN, endcode
+
+
+def scan_sku(sku):
+    """
+    Parse SKU in a single pass over its parts:  product prefix, design parts, H999 flag, endcode and size.
+    Gives the same result as get_code, get_design, get_product_type, get_design_color, get_design_endcode and
+    is_adult together.
+
+    :return: ParsedSku or None if SKU doesn't have a plain structure and needs the regex parser
+    """
+    match = PRODUCT_PREFIX.match(sku)
+    if not match:
+        return None
+    prefix_end = match.end()
+    if prefix_end < len(sku) and sku[prefix_end] != "_":
+        return None
+    product_type, prefix_color = PREFIX_INFO[match.group(0)]
+
+    tokens = sku[prefix_end + 1:].split("_") if prefix_end < len(sku) else []
+    size = None
+    if tokens and tokens[-1] in SIZES:
+        size = tokens.pop()
+
+    # color part right after the prefix:  KB_ZW_B_KOT_04B ===> KOT_04B
+    if len(tokens) > 1 and tokens[0] in ("B", "C"):
+        del tokens[0]
+
+    code_parts = []
+    design_parts = []
+    endcode = None
+    halftone = False
+    for token in tokens:
+        token_kind = classify_token(token)
+        if token_kind is None:
+            return None
+        kind, token_endcode = token_kind
+        if kind == SIZE_TOKEN:
+            return None
+        if kind == HALFTONE_TOKEN:
+            halftone = True
+            # H999 is removed from code, unless it is the first part
+            if code_parts:
+                continue
+
+        code_parts.append(token)
+        if endcode is None:
+            endcode = token_endcode
+        if kind != ENDCODE_TOKEN or len(code_parts) == 1:
+            design_parts.append(token)
+
+    code = "_".join(code_parts)
+    design = "_".join(design_parts)
+    start = 3 if LOOSE_ENDCODE.fullmatch(design[:3]) else 0
+    end = len(design)
+    if end - 3 >= start and LOOSE_ENDCODE.fullmatch(design[-3:]):
+        end -= 3
+    design = design[start:end]
+
+    if halftone:
+        design_color = "black_ht"
+    elif prefix_color == "gold" or not endcode:
+        design_color = prefix_color
+    elif "B" in endcode:
+        design_color = "white"
+    elif "C" in endcode:
+        design_color = "black"
+    else:
+        design_color = None
+
+    # Only t-shirts have kids sizes.
+    adult = product_type == "KOSZ" and size not in SMALL_SIZES
+
+    return ParsedSku(sku, code, design, product_type, FILE_TYPES.get(product_type), design_color, endcode, adult)
+
+
+def regex_parse_sku(sku):
+    """
+    Parse any SKU with the regex filters, used for SKUs which scan_sku can't handle.
+    """
+    code = get_code(sku)
+    product_type = get_product_type(sku)
+
+    return ParsedSku(
+        sku=sku,
+        code=code,
+        design_name=get_design(code),
+        product_type=product_type,
+        file_type=get_file_type(product_type),
+        design_color=get_design_color(sku, code),
+        endcode=get_design_endcode(code),
+        is_adult=is_adult(sku),
+    )
+
+
+class SkuParser:
+    """
+    Parses SKU strings to ParsedSku records. Parsing is pure, so results are memoized - the same SKUs repeat
+    thousands of times in a single export.
+    """
+
+    def __init__(self, cache_size: int = 4096):
+        self.parse = lru_cache(maxsize=cache_size)(self._parse)
+
+    @staticmethod
+    def _parse(sku: str) -> ParsedSku:
+        return scan_sku(sku) or regex_parse_sku(sku)
+
+
+SKU_PARSER = SkuParser()
+
+
+if __name__ == "__main__":
+    # Parsing benchmark:  python SkuParser.py orders.csv
+    import csv
+    import time
+
+    with open(sys.argv[1]) as f:
+        skus = [row[2] for row in csv.reader(f, delimiter=";") if len(row) > 2]
+
+    start_time = time.perf_counter()
+    for sku in skus:
+        regex_parse_sku(sku)
+    regex_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for sku in skus:
+        SkuParser._parse(sku)
+    scan_time = time.perf_counter() - start_time
+
+    parser = SkuParser()
+    start_time = time.perf_counter()
+    for sku in skus:
+        parser.parse(sku)
+    cached_time = time.perf_counter() - start_time
+
+    print(f"{len(skus)} SKUs, {len(set(skus))} unique")
+    print(f"regex: {regex_time:.3f}s, single pass: {scan_time:.3f}s, memoized: {cached_time:.3f}s")
@@ -0,0 +1,307 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+_PARENT = re.compile(r"'([^']+)' in parents")
+_NAME_CONTAINS = re.compile(r"name contains '([^']*)'")
+_NAME_EQUALS = re.compile(r"name\s*=\s*'([^']*)'")
+_MIME_CONTAINS = re.compile(r"mimeType contains '([^']*)'")
+_MIME_EQUALS = re.compile(r"mimeType\s*=\s*'([^']*)'")
+_RANGE = re.compile(r"bytes=(\d+)-(\d+)")
+_NAME_TERMS = re.compile(r"[\W_]+")
+
+ERROR_CONTENT = json.dumps(
+    {"error": {"code": 503, "message": "Backend Error", "errors": [{"reason": "backendError"}]}}
+).encode("utf-8")
+
+
+def get_name_terms(name: str) -> list:
+    return [term for term in _NAME_TERMS.split(name.lower()) if term]
+
+
+class FakeDriveService:
+    """
+    In-memory stand-in for googleapiclient Drive v3 service, used by benchmarks. Supports calls made by the app:
+    files().list with queries built in DriveAPI, files().get, files().get_media (downloaded with MediaIoBaseDownload),
+    changes() and batch requests. Every HTTP round trip waits latency seconds and fails with 503 with error_rate
+    probability, so retries and backoff are exercised too.
+    """
+
+    def __init__(self, files: list, contents: dict = None, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        """
+        :param files: Drive file resources - dicts with id, name, mimeType, parents, md5Checksum, modifiedTime
+        :param contents: dict, {mimeType: bytes} content returned by get_media for files of given type
+        :param latency: seconds each HTTP round trip takes
+        :param error_rate: part of HTTP round trips (and batched calls) failing with 503, 0 - 1
+        :param seed: seed of injected errors
+        """
+        self.contents = contents or {}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = Counter()  # methodId -> calls, batched calls included
+        self.round_trips = 0
+        self.errors = 0
+
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._files = {}
+        self._children = {}  # folder id -> list of files, in listing order
+        for file in files:
+            self._files[file["id"]] = file
+            for parent in file.get("parents", []):
+                self._children.setdefault(parent, []).append(file)
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests.clear()
+            self.round_trips = 0
+            self.errors = 0
+
+    def get_counters(self) -> dict:
+        with self._lock:
+            return {"round_trips": self.round_trips, "errors": self.errors, "requests": dict(self.requests)}
+
+    def _count(self, method_id: str) -> None:
+        with self._lock:
+            self.requests[method_id] += 1
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            failed = self.error_rate > 0 and self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            return failed
+
+    def round_trip(self) -> bool:
+        """
+        Wait for one HTTP round trip.
+
+        :return: False if the round trip should fail
+        """
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return not self._should_fail()
+
+    @staticmethod
+    def get_error(uri: str = None) -> HttpError:
+        return HttpError(httplib2.Response({"status": 503}), ERROR_CONTENT, uri=uri)
+
+    def files(self):
+        return FakeFilesResource(self)
+
+    def changes(self):
+        return FakeChangesResource(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatchRequest(self, callback)
+
+    def _match(self, file: dict, clauses: list) -> bool:
+        for clause in clauses:
+            parents = _PARENT.findall(clause)
+            if parents:
+                if not set(parents) & set(file.get("parents", [])):
+                    return False
+                continue
+
+            name_contains = _NAME_CONTAINS.fullmatch(clause)
+            if name_contains:
+                # Drive matches name terms by prefix, case insensitive.
+                terms = get_name_terms(file["name"])
+                if not all(
+                    any(term.startswith(part) for term in terms) for part in get_name_terms(name_contains.group(1))
+                ):
+                    return False
+                continue
+
+            name_equals = _NAME_EQUALS.fullmatch(clause)
+            if name_equals:
+                if file["name"] != name_equals.group(1):
+                    return False
+                continue
+
+            mime_contains = _MIME_CONTAINS.fullmatch(clause)
+            if mime_contains:
+                if mime_contains.group(1) not in file.get("mimeType", ""):
+                    return False
+                continue
+
+            mime_equals = _MIME_EQUALS.fullmatch(clause)
+            if mime_equals:
+                if file.get("mimeType") != mime_equals.group(1):
+                    return False
+                continue
+
+            raise ValueError(f"Query part not supported by fake Drive: {clause}")
+
+        return True
+
+    def list_files(self, q: str = None, pageSize: int = 100, pageToken: str = None, **kwargs) -> dict:
+        clauses = [clause.strip().strip("()") for clause in q.split(" and ")] if q else []
+
+        # Narrow down to listed folders first, like Drive does with its parents index.
+        parents = [parent for clause in clauses for parent in _PARENT.findall(clause)]
+        if parents:
+            candidates = []
+            seen = set()
+            for parent in parents:
+                for file in self._children.get(parent, []):
+                    if file["id"] not in seen:
+                        seen.add(file["id"])
+                        candidates.append(file)
+        else:
+            candidates = list(self._files.values())
+
+        found_files = [file for file in candidates if self._match(file, clauses)]
+
+        start = int(pageToken or 0)
+        page_size = pageSize or 100
+        response = {"files": [dict(file) for file in found_files[start:start + page_size]]}
+        if start + page_size < len(found_files):
+            response["nextPageToken"] = str(start + page_size)
+        return response
+
+    def get_file(self, fileId: str, **kwargs) -> dict:
+        file = self._files.get(fileId)
+        if file is None:
+            raise HttpError(httplib2.Response({"status": 404}), b'{"error": {"code": 404}}')
+        return dict(file)
+
+    def get_content(self, file_id: str) -> bytes:
+        return self.contents.get(self._files[file_id].get("mimeType"), b"")
+
+
+class FakeRequest:
+    """
+    Equivalent of googleapiclient HttpRequest - executed by the app or added to a batch.
+    """
+
+    def __init__(self, service: FakeDriveService, method_id: str, function, **kwargs):
+        self.service = service
+        self.methodId = method_id
+        self.uri = f"https://fake.drive/{method_id}"
+        self.headers = {}
+        self.http = FakeHttp(service)
+        self.function = function
+        self.kwargs = kwargs
+
+    def get_response(self):
+        self.service._count(self.methodId)
+        return self.function(**self.kwargs)
+
+    def execute(self, http=None, num_retries=0):
+        if not self.service.round_trip():
+            raise self.service.get_error(self.uri)
+        return self.get_response()
+
+
+class FakeMediaRequest(FakeRequest):
+    """
+    files().get_media request. MediaIoBaseDownload sends ranged GET requests through its http.
+    """
+
+    def __init__(self, service: FakeDriveService, file_id: str):
+        super().__init__(service, "drive.files.get_media", service.get_content, file_id=file_id)
+        self.uri = f"https://fake.drive/files/{file_id}?alt=media"
+        self.file_id = file_id
+
+
+class FakeHttp:
+    """
+    httplib2.Http replacement serving file content for MediaIoBaseDownload.
+    """
+
+    def __init__(self, service: FakeDriveService):
+        self.service = service
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        if not self.service.round_trip():
+            return httplib2.Response({"status": 503}), ERROR_CONTENT
+
+        file_id = uri.rsplit("/", 1)[-1].split("?", 1)[0]
+        self.service._count("drive.files.get_media")
+        content = self.service.get_content(file_id)
+
+        match = _RANGE.search((headers or {}).get("range", ""))
+        start, end = (int(match.group(1)), int(match.group(2))) if match else (0, len(content) - 1)
+        chunk = content[start:end + 1]
+        response = httplib2.Response(
+            {
+                "status": 206 if match else 200,
+                "content-range": f"bytes {start}-{start + len(chunk) - 1}/{len(content)}",
+                "content-length": str(len(chunk)),
+            }
+        )
+        return response, chunk
+
+
+class FakeFilesResource:
+    def __init__(self, service: FakeDriveService):
+        self.service = service
+
+    def list(self, **kwargs):
+        return FakeRequest(self.service, "drive.files.list", self.service.list_files, **kwargs)
+
+    def get(self, **kwargs):
+        return FakeRequest(self.service, "drive.files.get", self.service.get_file, **kwargs)
+
+    def get_media(self, fileId: str, **kwargs):
+        return FakeMediaRequest(self.service, fileId)
+
+
+class FakeChangesResource:
+    """
+    Drive without changes - stored catalog is always up to date.
+    """
+
+    def __init__(self, service: FakeDriveService):
+        self.service = service
+
+    def getStartPageToken(self, **kwargs):
+        return FakeRequest(self.service, "drive.changes.getStartPageToken", lambda: {"startPageToken": "1"})
+
+    def list(self, pageToken: str = None, **kwargs):
+        return FakeRequest(
+            self.service, "drive.changes.list", lambda: {"changes": [], "newStartPageToken": pageToken}
+        )
+
+
+class FakeBatchRequest:
+    """
+    Equivalent of googleapiclient BatchHttpRequest - one round trip, each call may fail on its own.
+    """
+
+    def __init__(self, service: FakeDriveService, callback=None):
+        self.service = service
+        self.callback = callback
+        self._requests = []
+
+    def add(self, request: FakeRequest, callback=None, request_id: str = None):
+        self._requests.append((request, callback, request_id or str(len(self._requests))))
+
+    def execute(self, http=None):
+        if not self.service.round_trip():
+            raise self.service.get_error()
+
+        for request, callback, request_id in self._requests:
+            callback = callback or self.callback
+            response, exception = None, None
+            if self.service._should_fail():
+                exception = self.service.get_error(request.uri)
+            else:
+                try:
+                    response = request.get_response()
+                except HttpError as error:
+                    exception = error
+            if callback:
+                callback(request_id, response, exception)
@@ -0,0 +1,299 @@
+import csv
+import hashlib
+import io
+import os
+import random
+import shutil
+
+from PIL import Image, ImageDraw
+
+from .fake_drive import FOLDER_MIME_TYPE
+
+
+# Design root folders, same keys as in drive_folders_destination.json.
+FOLDER_IDS = {
+    "WHITE_SHIRT_FOLDER_ID": "white-shirt",
+    "WHITE_CUP_FOLDER_ID": "white-cup",
+    "BLACK_SHIRT_FOLDER_ID": "black-shirt",
+    "BLACK_CUP_FOLDER_ID": "black-cup",
+    "BLACK_HALFTONE_SHIRT_FOLDER_ID": "black-halftone-shirt",
+    "GOLD_CUP_FOLDER_ID": "gold-cup",
+    "DOWNLOAD_DESIGNS_FOLDER_ID": "download-designs",
+}
+
+SYLLABLES = [
+    "ZA", "JA", "KO", "TA", "MA", "LI", "SO", "WO", "NE", "RU", "PI", "DA", "GO", "FI", "LU", "ME", "TU", "ZU", "RA",
+    "WI", "BA", "CE", "DU", "GE", "NI", "RO", "SE", "TO", "WA", "ZE",
+]
+VARIANTS = ["GEODE", "TOARG", "LZ", "KOLOR", "RED", "NAJ"]
+
+# SKU prefixes by design color, as in Baselinker exports.
+SHIRT_PREFIXES = {
+    "B": ["KOSZ_MES_B", "KOSZ_DAM_B", "KOSZ_DZIEC_B", "KOSZ_DZIEC_CHLOP_B", "KOSZ_DZIEC_DZIEW_B", "LEZA", "POD_ZW"],
+    "C": ["KOSZ_MES_C", "KOSZ_DAM_C", "KOSZ_DZIEC_C", "KOSZ_DZIEC_CHLOP_C", "KOSZ_DZIEC_DZIEW_C", "V1_LEZA"],
+}
+CUP_PREFIXES = {"B": ["KB_ZW", "1KB_ZW", "V1_KB_ZW", "KB_MAG"], "C": ["KB_MAG", "V2_KB_MAG", "KB_FUN_C"]}
+ADULT_SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+KIDS_SIZES = ["3-4", "5-6", "7-8", "9-11", "12-14"]
+
+# Column headers of Baselinker order export.
+ORDER_CSV_HEADER = ["Nr zamówienia", "Data", "Ilość sztuk nadruku", "SKU", "Nazwa produktu"]
+
+
+def get_design_names(count: int, rng: random.Random) -> list:
+    """
+    Unique design names made of 2 - 3 syllables, e.g. ZAJATO.
+    """
+    names = set()
+    while len(names) < count:
+        names.add("".join(rng.choice(SYLLABLES) for _ in range(rng.choice((2, 3, 3)))))
+    return sorted(names)
+
+
+def get_md5(value: str) -> str:
+    return hashlib.md5(value.encode("utf-8")).hexdigest()
+
+
+class DriveTree:
+    """
+    Synthetic design catalog in Drive file resource format, with design codes used to make matching orders.
+    """
+
+    def __init__(self):
+        self.files = []
+        self.codes = []  # design codes, e.g. ZAJATO_GEODE_04C
+        self.halftone_codes = set()
+        self.gold_codes = set()
+        self.design_endcodes = {}  # design folder name -> endcodes of its files
+
+    def add(self, name: str, parent: str, mime_type: str) -> str:
+        file_id = f"file-{len(self.files)}"
+        self.files.append(
+            {
+                "id": file_id,
+                "name": name,
+                "mimeType": mime_type,
+                "parents": [parent],
+                "md5Checksum": get_md5(name),
+                "modifiedTime": "2024-01-01T00:00:00.000Z",
+            }
+        )
+        return file_id
+
+
+def generate_drive_tree(design_count: int = 4000, seed: int = 0) -> DriveTree:
+    """
+    Build design catalog in the real naming scheme. Every design has 1 - 4 codes ending with endcode, B - white
+    design, C - black. Each code has PNG in shirt folder and PDF in cup folder, some have halftone and gold versions.
+    Download designs folder has a folder per design with subfolders of PNG files named design_endcode.
+
+    About 10 files and folders per design - 4000 designs make a catalog of about 40 000 files.
+    """
+    rng = random.Random(seed)
+    tree = DriveTree()
+
+    for design in get_design_names(design_count, rng):
+        variant = rng.choice(VARIANTS) if rng.random() < 0.4 else None
+        endcodes = sorted({f"{rng.randint(1, 40):02d}{rng.choice('BC')}" for _ in range(rng.randint(1, 4))})
+
+        for endcode in endcodes:
+            code = "_".join(part for part in (design, variant, endcode) if part)
+            tree.codes.append(code)
+            if endcode.endswith("B"):
+                tree.add(f"{code}.png", FOLDER_IDS["WHITE_SHIRT_FOLDER_ID"], "image/png")
+                tree.add(f"{code}.pdf", FOLDER_IDS["WHITE_CUP_FOLDER_ID"], "application/pdf")
+            else:
+                tree.add(f"{code}.png", FOLDER_IDS["BLACK_SHIRT_FOLDER_ID"], "image/png")
+                tree.add(f"{code}.pdf", FOLDER_IDS["BLACK_CUP_FOLDER_ID"], "application/pdf")
+                if rng.random() < 0.3:
+                    tree.add(f"{code}_H999.png", FOLDER_IDS["BLACK_HALFTONE_SHIRT_FOLDER_ID"], "image/png")
+                    tree.halftone_codes.add(code)
+            if rng.random() < 0.1:
+                tree.add(f"{code}.pdf", FOLDER_IDS["GOLD_CUP_FOLDER_ID"], "application/pdf")
+                tree.gold_codes.add(code)
+
+        design_folder_id = tree.add(design, FOLDER_IDS["DOWNLOAD_DESIGNS_FOLDER_ID"], FOLDER_MIME_TYPE)
+        subfolder_id = tree.add(f"{design} PNG", design_folder_id, FOLDER_MIME_TYPE)
+        for endcode in endcodes:
+            tree.add(f"{design}_{endcode}.png", subfolder_id, "image/png")
+        tree.design_endcodes[design] = endcodes
+
+    return tree
+
+
+def get_random_sku(tree: DriveTree, rng: random.Random, missing_rate: float = 0.02) -> str:
+    """
+    SKU of random design from the tree, missing_rate part of SKUs refer to designs which are not on Drive.
+    """
+    if rng.random() < missing_rate:
+        code = f"{''.join(rng.choice(SYLLABLES) for _ in range(4))}_{rng.randint(41, 99)}C"
+    else:
+        code = rng.choice(tree.codes)
+    color = code[-1]
+
+    kind = rng.random()
+    if kind < 0.1 and code in tree.gold_codes:
+        return f"KB_GOLD_GD_{code}"
+    if kind < 0.35:
+        return f"{rng.choice(CUP_PREFIXES[color])}_{code}"
+
+    prefix = rng.choice(SHIRT_PREFIXES[color])
+    parts = [prefix, code]
+    if code in tree.halftone_codes and rng.random() < 0.5:
+        parts.append("H999")
+    if prefix.startswith("KOSZ_DZIEC"):
+        parts.append(rng.choice(KIDS_SIZES))
+    elif prefix.startswith("KOSZ"):
+        parts.append(rng.choice(ADULT_SIZES))
+    return "_".join(parts)
+
+
+def generate_orders_csv(path: str, rows: int, tree: DriveTree, seed: int = 0, missing_rate: float = 0.02) -> str:
+    """
+    Write Baselinker order export with given number of rows. Orders have 1 - 4 rows, now and then the same design
+    is ordered twice in one order.
+    """
+    rng = random.Random(seed)
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(ORDER_CSV_HEADER)
+
+        order_number = 100000
+        written = 0
+        while written < rows:
+            order_number += 1
+            order_skus = [get_random_sku(tree, rng, missing_rate) for _ in range(rng.choice((1, 1, 1, 2, 2, 3, 4)))]
+            if rng.random() < 0.05:
+                order_skus.append(order_skus[0])
+
+            for sku in order_skus[:rows - written]:
+                writer.writerow([str(order_number), "2024-01-01 12:00", rng.choice((1, 1, 1, 2, 3)), sku, "Koszulka"])
+                written += 1
+
+    return path
+
+
+def generate_listed_files_csv(path: str, rows: int, tree: DriveTree, seed: int = 0, missing_rate: float = 0.02) -> str:
+    """
+    Write design list for FileDownloader - one design_endcode per row.
+    """
+    rng = random.Random(seed)
+    designs = sorted(tree.design_endcodes)
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        for _ in range(rows):
+            design = rng.choice(designs)
+            if rng.random() < missing_rate:
+                endcode = f"{rng.randint(41, 99)}C"
+            else:
+                endcode = rng.choice(tree.design_endcodes[design])
+            writer.writerow([f"{design}_{endcode}"])
+
+    return path
+
+
+def make_design_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """
+    RGBA design - colored shapes on transparent background, compresses like real print files.
+    """
+    rng = random.Random(seed)
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+
+    for _ in range(12):
+        x, y = rng.randrange(width), rng.randrange(height)
+        size = rng.randint(min(width, height) // 10, min(width, height) // 3)
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256), 255)
+        if rng.random() < 0.5:
+            draw.ellipse((x - size, y - size, x + size, y + size), fill=color)
+        else:
+            draw.rectangle((x - size, y - size, x + size, y + size), fill=color)
+
+    return image
+
+
+def make_png_bytes(width: int = 1200, height: int = 1500, seed: int = 0) -> bytes:
+    output = io.BytesIO()
+    make_design_image(width, height, seed).save(output, format="PNG", dpi=(300, 300))
+    return output.getvalue()
+
+
+def make_pdf_bytes(shapes: int = 400, seed: int = 0) -> bytes:
+    """
+    One page PDF with uncompressed content stream of vector shapes, like cup designs exported from graphic software.
+    """
+    rng = random.Random(seed)
+
+    operations = []
+    for _ in range(shapes):
+        operations.append(
+            f"{rng.random():.3f} {rng.random():.3f} {rng.random():.3f} rg "
+            f"{rng.randint(0, 600)} {rng.randint(0, 250)} {rng.randint(5, 80)} {rng.randint(5, 80)} re f"
+        )
+    operations.append(f"BT /F1 24 Tf 40 120 Td (Design {seed}) Tj ET")
+    content = "\n".join(operations).encode("latin-1")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 650 300] /Resources << /Font << /F1 4 0 R >> >> "
+        b"/Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+    ]
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    xref_offset = output.tell()
+    output.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        output.write(b"%010d 00000 n \n" % offset)
+    output.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+
+    return output.getvalue()
+
+
+def generate_png_files(folder: str, count: int, seed: int = 0) -> str:
+    """
+    Write count PNG designs of various sizes and orientations to folder.
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+
+    for i in range(count):
+        width, height = rng.randint(600, 2400), rng.randint(600, 2400)
+        make_design_image(width, height, seed=rng.randrange(1 << 30)).save(
+            os.path.join(folder, f"design_{i:04d}.png"), dpi=(200, 200)
+        )
+
+    return folder
+
+
+def generate_pdf_files(folder: str, count: int, copies: int = 3, seed: int = 0) -> str:
+    """
+    Write count PDF designs to category subfolders of folder. Designs come in FAKTORIA style "(n)" copies - files
+    with the same content - copies files per design.
+    """
+    rng = random.Random(seed)
+
+    for i in range(count):
+        category_folder = os.path.join(folder, f"KUBKI_{i % 3}")
+        os.makedirs(category_folder, exist_ok=True)
+
+        copy_number = i % copies + 1
+        path = os.path.join(category_folder, f"design_{i // copies:04d} ({copy_number}).pdf")
+        if copy_number == 1:
+            with open(path, "wb") as f:
+                f.write(make_pdf_bytes(seed=rng.randrange(1 << 30)))
+            first_copy = path
+        else:
+            shutil.copyfile(first_copy, path)
+
+    return folder
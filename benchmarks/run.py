@@ -0,0 +1,335 @@
+"""
+Benchmarks of order processing, Drive search and download, PNG and PDF merging. Drive is replaced by local
+FakeDriveService with a synthetic design catalog, so runs are repeatable and need no credentials.
+
+Run from repository folder:
+    python -m benchmarks.run                    # order exports of 100 and 10 000 rows
+    python -m benchmarks.run --full             # also 100 000 rows
+    python -m benchmarks.run --latency-ms 50 --error-rate 0.02
+
+Results are saved in benchmarks/results and compared with the previous run with the same Drive options.
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from unittest import mock
+
+from .fake_drive import FakeDriveService
+from .generators import (
+    FOLDER_IDS,
+    generate_drive_tree,
+    generate_listed_files_csv,
+    generate_orders_csv,
+    generate_pdf_files,
+    generate_png_files,
+    make_pdf_bytes,
+    make_png_bytes,
+)
+
+
+REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_FOLDER = os.path.join(REPO_FOLDER, "benchmarks", "results")
+
+DEFAULT_ROWS = [100, 10000]
+FULL_ROWS = [100, 10000, 100000]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="BLOrders benchmarks against local fake Drive.")
+    parser.add_argument("--rows", type=int, nargs="+", help="order export sizes (default 100 10000)")
+    parser.add_argument("--full", action="store_true", help="order exports of 100, 10 000 and 100 000 rows")
+    parser.add_argument("--designs", type=int, default=4000, help="designs in fake Drive catalog, ~6 files each")
+    parser.add_argument("--downloads", type=int, default=200, help="orders downloaded by find_file_and_download")
+    parser.add_argument("--listed", type=int, default=100, help="rows of FileDownloader design list")
+    parser.add_argument("--pngs", type=int, default=24, help="PNG designs merged into sheets")
+    parser.add_argument("--pdfs", type=int, default=60, help="PDF files merged, 3 copies of each design")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fake Drive round trip time")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="part of Drive requests failing with 503")
+    parser.add_argument("--qps", type=float, default=0.0, help="Drive queries per second limit, 0 - no limit")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of local benchmarks, the best one counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown reported as regression, 0.2 = 20%%")
+    parser.add_argument("--results", default=RESULTS_FOLDER, help="folder of result files")
+    parser.add_argument("--no-save", action="store_true", help="don't save results")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with 1 if a benchmark regressed")
+    parser.add_argument("--keep", action="store_true", help="keep generated files and outputs")
+    parser.add_argument("--verbose", action="store_true", help="show output of benchmarked functions")
+    return parser.parse_args(argv)
+
+
+@contextlib.contextmanager
+def silence(verbose=False):
+    if verbose:
+        yield
+        return
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+class BenchmarkRunner:
+    def __init__(self, service: FakeDriveService, repeat: int = 1, verbose: bool = False):
+        self.service = service
+        self.repeat = repeat
+        self.verbose = verbose
+        self.results = {}
+
+    def run(self, name: str, function, repeat: int = None, drive: bool = False) -> dict:
+        """
+        Time function, the best of repeat runs counts.
+
+        :param function: benchmarked function, may return dict of extra result fields, e.g. number of items
+        :param drive: function talks to Drive, its request counts are added to result
+        """
+        times = []
+        info = {}
+        for _ in range(repeat or self.repeat):
+            self.service.reset_counters()
+            with silence(self.verbose):
+                started = time.perf_counter()
+                info = function() or {}
+                times.append(time.perf_counter() - started)
+
+        result = {"seconds": round(min(times), 4), "runs": len(times)}
+        result.update(info)
+        if drive:
+            result["drive"] = self.service.get_counters()
+        self.results[name] = result
+
+        items = info.get("items")
+        per_item = f", {min(times) / items * 1000:.3f} ms/item" if items else ""
+        print(f"{name}: {min(times):.3f} s{per_item}")
+        return result
+
+
+def run_benchmarks(args, work_folder: str) -> dict:
+    # App modules read drive_folders_destination.json from working directory when imported.
+    import FileDownloader
+    import ImageEdit
+    from DriveAPI import DRIVE_SCHEDULER, CatalogStore, DriveCatalog
+    from OrderHandler import Order, find_file_and_download, get_orders, read_order_rows, resolve_orders
+    from PDFMerge import merge_pdf
+
+    DRIVE_SCHEDULER.queries_per_second = args.qps
+    DRIVE_SCHEDULER.burst = max(1, int(args.qps))
+    # Injected errors are retried almost at once, delays of real backoff would only measure sleeping.
+    DRIVE_SCHEDULER.base_delay = 0.01
+
+    print(f"Generating Drive catalog of {args.designs} designs...")
+    tree = generate_drive_tree(args.designs, seed=args.seed)
+    service = FakeDriveService(
+        tree.files,
+        contents={"image/png": make_png_bytes(seed=args.seed), "application/pdf": make_pdf_bytes(seed=args.seed)},
+        latency=args.latency_ms / 1000,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    print(f"Catalog has {len(tree.files)} files.")
+
+    runner = BenchmarkRunner(service, repeat=args.repeat, verbose=args.verbose)
+
+    catalog = DriveCatalog(service, CatalogStore(os.path.join(work_folder, "catalog.sqlite3")))
+    runner.run(
+        "catalog_load",
+        lambda: catalog.load_folders([folder_id for key, folder_id in FOLDER_IDS.items() if "DOWNLOAD" not in key]),
+        repeat=1,
+        drive=True,
+    )
+
+    for rows in args.rows:
+        csv_path = generate_orders_csv(os.path.join(work_folder, f"orders_{rows}.csv"), rows, tree, seed=args.seed)
+        order_rows = list(read_order_rows(csv_path))
+
+        runner.run(f"get_orders[{rows}]", lambda: {"items": len(get_orders(csv_path))})
+        runner.run(
+            f"order_construction[{rows}]",
+            lambda: {"items": len([Order(order_id, quantity, sku) for order_id, quantity, sku in order_rows])},
+        )
+
+        orders = get_orders(csv_path)
+
+        def resolve():
+            resolve_orders(service, orders, catalog=catalog)
+            return {"items": len(orders), "found": sum(1 for order in orders if order.file_id)}
+
+        runner.run(f"resolve_orders[{rows}]", resolve, repeat=1, drive=True)
+
+        found_orders = [order for order in orders if order.file_id][:args.downloads]
+        output_folder = os.path.join(work_folder, f"Baselinker - {rows}")
+
+        def download():
+            for order in found_orders:
+                find_file_and_download(service, order, output_folder)
+            return {"items": len(found_orders)}
+
+        runner.run(f"find_file_and_download[{rows}]", download, repeat=1, drive=True)
+
+    listed_csv_path = generate_listed_files_csv(
+        os.path.join(work_folder, "listed_files.csv"), args.listed, tree, seed=args.seed
+    )
+
+    def download_listed_files():
+        with mock.patch.object(FileDownloader, "get_service", return_value=service), mock.patch.object(
+            FileDownloader, "get_oauth_credentials", return_value=None
+        ), mock.patch.object(
+            FileDownloader, "get_catalog_store_path", return_value=os.path.join(work_folder, "listed.sqlite3")
+        ):
+            FileDownloader.download_listed_files(listed_csv_path, FOLDER_IDS["DOWNLOAD_DESIGNS_FOLDER_ID"], False)
+        return {"items": args.listed}
+
+    runner.run("download_listed_files", download_listed_files, repeat=1, drive=True)
+
+    png_folder = generate_png_files(os.path.join(work_folder, "png"), args.pngs, seed=args.seed)
+    sheets_folder = os.path.join(work_folder, "sheets")
+
+    def merge():
+        os.makedirs(sheets_folder, exist_ok=True)
+        return {"items": ImageEdit.merge(png_folder, sheets_folder)}
+
+    runner.run("merge", merge, repeat=1)
+
+    pdf_folder = generate_pdf_files(os.path.join(work_folder, "pdf"), args.pdfs, seed=args.seed)
+    merged_pdf_folder = os.path.join(work_folder, "merged_pdf")
+
+    def merge_pdf_files():
+        os.makedirs(merged_pdf_folder, exist_ok=True)
+        _, count = merge_pdf(pdf_folder, merged_pdf_folder)
+        return {"items": count}
+
+    runner.run("merge_pdf", merge_pdf_files, repeat=1)
+
+    catalog.store.close()
+    return runner.results
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_FOLDER, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_drive_options(report: dict) -> tuple:
+    options = report.get("options", {})
+    return options.get("latency_ms"), options.get("error_rate"), options.get("qps"), options.get("designs")
+
+
+def find_previous_report(results_folder: str, report: dict) -> dict:
+    """
+    Latest saved report made with the same Drive options, None if there is none.
+    """
+    for path in sorted(glob.glob(os.path.join(results_folder, "*.json")), reverse=True):
+        try:
+            with open(path, encoding="utf-8") as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if get_drive_options(previous) == get_drive_options(report):
+            previous["path"] = path
+            return previous
+    return None
+
+
+def compare_reports(report: dict, previous: dict, threshold: float) -> list:
+    """
+    Print change of every benchmark since previous report.
+
+    :return: names of benchmarks slower by more than threshold
+    """
+    print(f"\nCompared with {os.path.basename(previous['path'])} ({previous.get('commit')}):")
+    regressions = []
+
+    for name, result in report["results"].items():
+        previous_result = previous["results"].get(name)
+        if not previous_result:
+            print(f"  {name}: {result['seconds']:.3f} s (new)")
+            continue
+
+        seconds, previous_seconds = result["seconds"], previous_result["seconds"]
+        change = (seconds - previous_seconds) / previous_seconds if previous_seconds else 0.0
+        # Times of a few milliseconds are mostly noise.
+        regressed = change > threshold and seconds - previous_seconds > 0.01
+        if regressed:
+            regressions.append(name)
+        mark = "  <== REGRESSION" if regressed else ""
+        print(f"  {name}: {previous_seconds:.3f} s -> {seconds:.3f} s ({change:+.0%}){mark}")
+
+    return regressions
+
+
+def save_report(results_folder: str, report: dict) -> str:
+    os.makedirs(results_folder, exist_ok=True)
+    path = os.path.join(results_folder, f"{datetime.now().strftime('%Y-%m-%d - %H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    return path
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not args.rows:
+        args.rows = FULL_ROWS if args.full else DEFAULT_ROWS
+
+    report = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {
+            "rows": args.rows,
+            "designs": args.designs,
+            "downloads": args.downloads,
+            "listed": args.listed,
+            "pngs": args.pngs,
+            "pdfs": args.pdfs,
+            "latency_ms": args.latency_ms,
+            "error_rate": args.error_rate,
+            "qps": args.qps,
+            "seed": args.seed,
+        },
+    }
+
+    # Outputs, logs, caches and catalog stores of benchmarked code are written to working directory.
+    work_folder = tempfile.mkdtemp(prefix="blorders-benchmark-")
+    with open(os.path.join(work_folder, "drive_folders_destination.json"), "w", encoding="utf-8") as f:
+        json.dump(dict(FOLDER_IDS, API_NAME="drive", API_VERSION="v3", SCOPES=[]), f)
+
+    current_folder = os.getcwd()
+    os.chdir(work_folder)
+    sys.path.insert(0, REPO_FOLDER)
+    try:
+        report["results"] = run_benchmarks(args, work_folder)
+    finally:
+        os.chdir(current_folder)
+        if "RunLogger" in sys.modules:
+            sys.modules["RunLogger"].RUN_LOG.close()
+        if args.keep:
+            print(f"\nGenerated files and outputs: {work_folder}")
+        else:
+            shutil.rmtree(work_folder, ignore_errors=True)
+
+    previous = find_previous_report(args.results, report)
+    regressions = compare_reports(report, previous, args.threshold) if previous else []
+
+    if not args.no_save:
+        print(f"\nResults: {save_report(args.results, report)}")
+
+    if regressions:
+        print(f"\nSlower by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,57 @@
 import json
+import os
+
+from dotenv import load_dotenv
 
 from utils import resource_path
 
+load_dotenv()
+
 CONTRACTOR = None
 
+# How FAKTORIA copies of a design for every printed piece are made: copy, hardlink, reflink, symlink or manifest
+# (one file and its quantity in manifest.csv of the category folder).
+FAKTORIA_COPY_MODE = os.getenv("FAKTORIA_COPY_MODE", "copy")
+
+# Number of designs downloaded at the same time. 1 downloads orders one by one.
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", 8))
+
+# Size of single design download request. Downloaded content is written to disk chunk by chunk, so it is also
+# the max memory used per download.
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_MB", 16)) * 1024 * 1024
+
+# Drive requests budget shared by all threads (Drive allows 12000 queries per minute per user). 0 turns it off.
+DRIVE_QUERIES_PER_SECOND = float(os.getenv("DRIVE_QUERIES_PER_SECOND", 100))
+# How many times Drive request is sent again after rate limit (403, 429) or server error (5xx).
+DRIVE_MAX_RETRIES = int(os.getenv("DRIVE_MAX_RETRIES", 6))
+
+# JSON file where found design folders are kept between runs. Not set - folders are searched again on every run.
+DESIGN_FOLDER_CACHE_FILE = os.getenv("DESIGN_FOLDER_CACHE_FILE") or None
+
+# Use asyncio Drive client (needs aiohttp) for lookups and downloads instead of worker threads.
+ASYNC_DRIVE = os.getenv("ASYNC_DRIVE", "0") == "1"
+# Max number of requests sent at the same time by asyncio Drive client.
+ASYNC_DRIVE_CONNECTIONS = int(os.getenv("ASYNC_DRIVE_CONNECTIONS", 64))
+
+# Local copies of downloaded designs. Size 0 turns the cache off.
+DESIGN_CACHE_FOLDER = os.getenv("DESIGN_CACHE_FOLDER", os.path.join(os.getcwd(), "design_cache"))
+DESIGN_CACHE_MAX_MB = int(os.getenv("DESIGN_CACHE_MAX_MB", 2048))
+
+# Number of processes merging PNG sheets at the same time, defaults to number of CPU cores.
+MERGE_WORKERS = int(os.getenv("MERGE_WORKERS", os.cpu_count() or 1))
+# Memory budget in MB of PNG sheets merged at the same time, 0 for no limit.
+MERGE_MEMORY_MB = int(os.getenv("MERGE_MEMORY_MB", 2048))
+# Size of PNG sheet designs are packed into. Sheet is cut after the last design, so width is the max width.
+SHEET_WIDTH_CM = float(os.getenv("SHEET_WIDTH_CM", 150))
+SHEET_HEIGHT_CM = float(os.getenv("SHEET_HEIGHT_CM", 30))
+# Film width in cm. If set, designs are merged into one continuous roll PNG instead of sheets.
+ROLL_WIDTH_CM = float(os.getenv("ROLL_WIDTH_CM", 0))
+
+# Profile downloads and merging with cProfile and tracemalloc, profiles are saved in logs folder. See profiling.py.
+PROFILING = os.getenv("PROFILING", "0") == "1"
+# Number of lines in memory report of profiled run.
+PROFILING_TOP_ALLOCATIONS = int(os.getenv("PROFILING_TOP_ALLOCATIONS", 25))
+
 SMALL_SIZES = ["3-4", "5-6", "7-8"]
 PRODUCTS = ["LEZA", "KOSZ", "POD", "KB_ZW", "KB_MAG", "KB_FUN", "KB_GOLD"]
 
@@ -1,35 +1,41 @@
 import os
 import csv
+import time
 
+from RunLogger import RUN_LOG
 
-def save_error_to_file(message, folder_path, datetime_string):
-    current_folder = os.getcwd()
-    logs_folder_path = os.path.join(current_folder, "logs")
-    error_path = os.path.join(folder_path, logs_folder_path)
 
-    if not os.path.exists(error_path):
-        os.makedirs(error_path)
+def save_error_to_file(message, folder_path=None, datetime_string=None, **fields):
+    """
+    Log error in the run log (see RunLogger). folder_path and datetime_string are not used anymore, all records
+    of a run go to one file.
+    """
+    RUN_LOG.error(message.strip(), **fields)
 
-    with open(
-        os.path.join(error_path, f"error_log - {datetime_string}.txt"),
-        "a",
-        encoding="utf-8",
-    ) as e:
-        e.write(message)
 
+def save_search_log_to_file(message, folder_path=None, datetime_string=None, **fields):
+    """
+    Log search in the run log (see RunLogger). folder_path and datetime_string are not used anymore.
+    """
+    RUN_LOG.log("search", message=message.strip(), **fields)
 
-def save_search_log_to_file(message, folder_path, datetime_string):
-    current_folder = os.getcwd()
-    logs_folder_path = os.path.join(current_folder, "logs")
-    error_path = os.path.join(folder_path, logs_folder_path)
 
-    if not os.path.exists(error_path):
-        os.makedirs(error_path)
+def log_search(query, found_files, result, started, **fields):
+    """
+    Log design search as structured record of the run log.
 
-    with open(
-        os.path.join(error_path, f"search_log - {datetime_string}.txt"), "a"
-    ) as e:
-        e.write(message)
+    :param found_files: files matching the query, None if search failed
+    :param result: chosen file or None
+    :param started: time.perf_counter() when search started
+    """
+    RUN_LOG.log(
+        "search",
+        query=query,
+        found=None if found_files is None else [file.get("name") for file in found_files],
+        result=result.get("name") if result else None,
+        latency_ms=round((time.perf_counter() - started) * 1000, 1),
+        **fields,
+    )
 
 
 def save_list_to_csv(items_list: list, destination_folder: str, file_name: str) -> None:
@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class RunStats:
+    """
+    Wall time, number of calls and bytes of run stages - csv parsing, Drive search, download, resize, copy...
+    Thread safe. Times of stages run by download workers are summed, so a stage may take longer than the run.
+
+    Usage:
+        with RUN_STATS.measure("download") as stage:
+            ...
+            stage["bytes"] = downloaded_size
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start_run()
+
+    def start_run(self) -> None:
+        with self._lock:
+            self.started = datetime.now()
+            self._started = time.perf_counter()
+            self.stages = {}  # stage -> {"calls": 0, "seconds": 0.0, "bytes": 0}
+
+    def add(self, stage: str, seconds: float, calls: int = 1, size: int = 0) -> None:
+        with self._lock:
+            stats = self.stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "bytes": 0})
+            stats["calls"] += calls
+            stats["seconds"] += seconds
+            stats["bytes"] += size
+
+    @contextmanager
+    def measure(self, stage: str):
+        """
+        Add time of the with block to stage. Yields dict, its "bytes" value is added to stage bytes.
+        """
+        record = {"bytes": 0}
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.add(stage, time.perf_counter() - started, size=record["bytes"])
+
+    def measure_iter(self, stage: str, iterable):
+        """
+        Yield items of iterable, time spent on producing them (e.g. reading csv rows) is added to stage.
+        """
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - started, calls=0)
+                return
+            self.add(stage, time.perf_counter() - started)
+            yield item
+
+    def get_report(self, **extra) -> dict:
+        """
+        :param extra: additional report fields, e.g. order counts
+        :return: dict, {"started": ..., "wall_seconds": ..., "stages": {stage: {"calls", "seconds", "bytes",
+            "mb_per_second"}}, **extra}
+        """
+        with self._lock:
+            stages = {stage: dict(stats) for stage, stats in self.stages.items()}
+            wall_seconds = time.perf_counter() - self._started
+            started = self.started
+
+        for stats in stages.values():
+            if stats["bytes"] and stats["seconds"]:
+                stats["mb_per_second"] = round(stats["bytes"] / 1024 / 1024 / stats["seconds"], 2)
+            stats["seconds"] = round(stats["seconds"], 3)
+
+        report = {"started": started.isoformat(timespec="seconds"), "wall_seconds": round(wall_seconds, 3)}
+        report["stages"] = stages
+        report.update(extra)
+        return report
+
+    def save_report(self, path: str, **extra) -> dict:
+        """
+        Write run report to JSON file and print stages summary.
+        """
+        report = self.get_report(**extra)
+
+        temp_path = f"{path}.part"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        os.replace(temp_path, path)
+
+        print(f"\nRun took {report['wall_seconds']} s:")
+        for stage, stats in report["stages"].items():
+            speed = f", {stats['mb_per_second']} MB/s" if "mb_per_second" in stats else ""
+            print(f"  {stage}: {stats['calls']} calls, {stats['seconds']} s{speed}")
+        print(f"Run report: {path}")
+
+        return report
+
+
+# Shared by the whole program, reset at the start of each run.
+RUN_STATS = RunStats()
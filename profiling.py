@@ -0,0 +1,121 @@
+import cProfile
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from RunLogger import RUN_LOG
+from constants import PROFILING, PROFILING_TOP_ALLOCATIONS
+
+
+class Profiler:
+    """
+    Profiling mode of long runs - downloads, PNG and PDF merging. Run is wrapped in cProfile and tracemalloc, results
+    are saved in logs folder:
+        <name> - <start time>.prof          cProfile stats, open with pstats or snakeviz
+        <name> - <start time> - profile.txt functions with the highest cumulative time
+        <name> - <start time> - memory.txt  peak traced memory and lines holding most memory at the end of the run
+
+    cProfile sees only the thread which started the run. Download workers and merge processes are not profiled,
+    set DOWNLOAD_WORKERS and MERGE_WORKERS to 1 to profile the whole run. tracemalloc traces all threads, but only
+    memory allocated by Python - pixel buffers of Pillow images are not counted. Lines of memory report are taken
+    from a snapshot at the end of the run, memory freed before (e.g. of a merged sheet) is only part of the peak.
+    """
+
+    def __init__(self, enabled: bool = False, folder: str = None, top_allocations: int = 25, top_functions: int = 50):
+        """
+        :param enabled: profile runs, may be switched at any time, e.g. from GUI
+        :param folder: folder of profile files, RUN_LOG folder if None
+        :param top_allocations: number of lines in memory report
+        :param top_functions: number of functions in profile report
+        """
+        self.enabled = enabled
+        self.folder = folder
+        self.top_allocations = top_allocations
+        self.top_functions = top_functions
+        self._lock = threading.Lock()
+        self._active = False
+
+    @contextmanager
+    def profile(self, name: str):
+        """
+        Profile with block if profiling is enabled. Runs started inside a profiled run are not profiled separately.
+
+        :param name: run name used in file names, e.g. OrderHandler.main
+        """
+        with self._lock:
+            start = self.enabled and not self._active
+            if start:
+                self._active = True
+        if not start:
+            yield
+            return
+
+        started = datetime.now()
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profile = cProfile.Profile()
+
+        print(f"Profiling {name}...")
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            # Peak is read first, the snapshot itself allocates memory.
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+
+            try:
+                self.save(name, started, profile, snapshot, peak)
+            finally:
+                with self._lock:
+                    self._active = False
+
+    def save(self, name: str, started: datetime, profile: cProfile.Profile, snapshot, peak: int) -> None:
+        folder = self.folder or RUN_LOG.folder
+        os.makedirs(folder, exist_ok=True)
+        base_path = os.path.join(folder, f"{name} - {started.strftime('%d-%m-%Y - %H%M%S')}")
+
+        profile.dump_stats(f"{base_path}.prof")
+        with open(f"{base_path} - profile.txt", "w", encoding="utf-8") as f:
+            stats = pstats.Stats(profile, stream=f)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_functions)
+
+        # Allocations of tracemalloc itself would only blur the report.
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        statistics = snapshot.statistics("lineno")
+        with open(f"{base_path} - memory.txt", "w", encoding="utf-8") as f:
+            f.write(f"Peak traced memory during the run: {peak / 1024 / 1024:.1f} MB\n")
+            f.write(f"Memory still allocated at the end: {sum(stat.size for stat in statistics) / 1024 / 1024:.1f} MB\n")
+            f.write(f"\nTop {self.top_allocations} lines by memory still allocated at the end (not at the peak):\n")
+            for stat in statistics[:self.top_allocations]:
+                f.write(f"{stat}\n")
+
+        RUN_LOG.log("profile", name=name, path=base_path, peak_mb=round(peak / 1024 / 1024, 1))
+        print(f"Profile of {name} saved: {base_path}")
+
+
+def profiled(function):
+    """
+    Decorator - profile every call of function with PROFILER when profiling is enabled.
+    """
+    name = f"{function.__module__}.{function.__qualname__}"
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with PROFILER.profile(name):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+# Shared by the whole program, enabled by PROFILING option or GUI checkbox.
+PROFILER = Profiler(PROFILING, top_allocations=PROFILING_TOP_ALLOCATIONS)
@@ -1,9 +1,18 @@
 import sys
 import os
+import codecs
 import csv
+import hashlib
+import shutil
 
 from datetime import datetime, timedelta
 
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, reflinks fall back to copy there.
+    fcntl = None
+
 
 def resource_path(relative_path):
     if hasattr(sys, "_MEIPASS"):
@@ -24,6 +33,88 @@ def get_default_folder_path(
     return destination_path
 
 
+# Ways a file can be copied by copy_file.
+COPY_MODES = ("copy", "hardlink", "reflink", "symlink")
+
+# ioctl cloning file content on copy-on-write filesystems (Btrfs, XFS), from linux/fs.h
+FICLONE = 0x40049409
+
+
+def reflink(src: str, dst: str) -> None:
+    """
+    Create dst sharing content of src file until one of them is changed. Raises OSError if not supported.
+    """
+    if fcntl is None:
+        raise OSError("Reflinks are not supported on this system.")
+
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+
+
+def copy_file(src: str, dst: str, mode: str = "copy") -> None:
+    """
+    Make dst a copy of src file. Existing dst is replaced. Falls back to plain copy when given mode is not
+    supported, e.g. hardlink across drives, reflink on NTFS or symlink without Windows developer mode.
+
+    :param mode: one of COPY_MODES - "copy", "hardlink", "reflink" or "symlink" (relative to dst folder)
+    """
+    if mode not in COPY_MODES:
+        raise ValueError(f"Unknown copy mode {mode}, expected one of: {', '.join(COPY_MODES)}")
+
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    try:
+        if mode == "hardlink":
+            os.link(src, dst)
+            return
+        if mode == "symlink":
+            os.symlink(os.path.relpath(src, os.path.dirname(dst)), dst)
+            return
+        if mode == "reflink":
+            reflink(src, dst)
+            return
+    except OSError:
+        if os.path.lexists(dst):
+            os.remove(dst)
+
+    shutil.copyfile(src, dst)
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """
+    Hardlink src file as dst. Falls back to copy when hardlinks are not supported, e.g. across drives.
+    """
+    copy_file(src, dst, "hardlink")
+
+
+def get_file_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    SHA-256 of file content, read in chunks.
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def detect_encoding(file_path: str, sample_size: int = 64 * 1024) -> str:
+    """
+    Guess encoding of a csv export - Baselinker exports are either utf-8 (with or without BOM) or cp1250.
+    Only the beginning of the file is checked, full exports have polish characters already in the header row.
+    """
+    with open(file_path, "rb") as f:
+        sample = f.read(sample_size)
+
+    try:
+        # Incremental decoder doesn't fail on a character cut at the end of the sample.
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return "cp1250"
+    return "utf-8-sig"
+
+
 def list_file_data_from_csv(csv_file_path: str) -> list:
     with open(csv_file_path, encoding="utf-8") as f:
         csv_reader = csv.reader(f, delimiter=";")